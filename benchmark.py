@@ -0,0 +1,168 @@
+# Copyright 2021, Andres Fredes, <andres.hector.fredes@gmail.com>
+# 
+# This file is part of timesheet.
+# 
+#     timesheet is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+# 
+#     timesheet is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+# 
+#     You should have received a copy of the GNU General Public License
+#     along with timesheet.  If not, see <https://www.gnu.org/licenses/>.
+
+
+"""Timesheet: task/project time keeping program.
+
+benchmark.py times the model's queries, History rendering and UI refreshes
+against generated databases of each of BENCHMARK_SIZES records, using Qt's
+offscreen platform so no display is needed. Results are written as JSON, so
+that they can be compared between runs:
+
+    python benchmark.py [OUTPUT] [SIZE ...]
+
+Each database is generated by synthetic.py in a temporary directory, with the
+newest session left running.
+"""
+
+import json, os, platform, sqlite3, statistics, sys, tempfile
+from datetime import datetime as dt
+from time import perf_counter
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt5.QtCore import QT_VERSION_STR
+from PyQt5.QtWidgets import QApplication
+
+from config import BENCHMARK_SIZES, BENCHMARK_REPEATS, HISTORY_PAGE
+from database import connect
+from storage import migrate
+from synthetic import generate
+
+
+def run(sizes=BENCHMARK_SIZES, repeats=BENCHMARK_REPEATS):
+    """Benchmarks each database size in turn.
+
+    Args:
+        sizes (list): number of records in each database benchmarked.
+        repeats (int): number of timed calls of each benchmark.
+
+    Returns:
+        (dict): the environment the benchmarks were run in, and the results
+            for each size. See benchmark_size().
+    """
+    app = QApplication.instance() or QApplication(sys.argv)
+    results = {
+        "started": dt.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "qt": QT_VERSION_STR,
+        "platform": platform.platform(),
+        "repeats": repeats,
+        "sizes": {}
+    }
+    cwd = os.getcwd()
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            # The program's database is always DATA_DIR within the cwd
+            os.chdir(directory)
+            try:
+                results["sizes"][str(size)] = benchmark_size(
+                    app, size, repeats
+                )
+            finally:
+                os.chdir(cwd)
+    return results
+
+
+def benchmark_size(app, size, repeats):
+    """Generates a database of the given size in the cwd and benchmarks it.
+
+    Args:
+        app (QApplication): the running application.
+        size (int): number of records to generate.
+        repeats (int): number of timed calls of each benchmark.
+
+    Returns:
+        (dict): seconds taken to generate the database, and the timings of
+            each benchmark as from _time().
+    """
+    # Imported here as the gui creates widgets, which need a QApplication
+    from gui import UI
+
+    start = perf_counter()
+    db = connect()
+    migrate(db)
+    generate(db, size, open_share=1.0)
+    db.close()
+    generated = perf_counter() - start
+
+    ui = UI()
+    ui.show()
+    app.processEvents()
+    model = ui.model
+    while model.rowCount() < HISTORY_PAGE and model.canFetchMore():
+        model.fetchMore()
+    indexes = [
+        model.index(row, column)
+        for row in range(min(HISTORY_PAGE, model.rowCount()))
+        for column in range(model.columnCount())
+    ]
+
+    def render_cold():
+        model._display.clear()
+        for index in indexes:
+            model.data(index)
+
+    def render_warm():
+        for index in indexes:
+            model.data(index)
+
+    benchmarks = {
+        "tasks_projects": model.tasks_projects,
+        "current_task_project": model.current_task_project,
+        "most_recent": model.most_recent,
+        "get_total_time_task": lambda: model.get_total_time("task", "Task 0"),
+        "get_total_time_project":
+            lambda: model.get_total_time("project", "Project 0"),
+        "data_page_cold": render_cold,
+        "data_page_warm": render_warm,
+        "refresh_UI": ui.refresh_UI
+    }
+    timings = {}
+    for name, func in benchmarks.items():
+        timings[name] = _time(func, repeats)
+        app.processEvents()
+    ui.close()
+    return {"generate_s": round(generated, 3), "timings": timings}
+
+
+def _time(func, repeats):
+    # The first call is not timed, so that each benchmark starts warm.
+    func()
+    times = []
+    for _ in range(repeats):
+        start = perf_counter()
+        func()
+        times.append((perf_counter() - start) * 1000)
+    return {
+        "median_ms": round(statistics.median(times), 4),
+        "min_ms": round(min(times), 4),
+        "max_ms": round(max(times), 4)
+    }
+
+
+if __name__ == '__main__':
+    output = sys.argv[1] if len(sys.argv) > 1 else "benchmark.json"
+    sizes = [int(size) for size in sys.argv[2:]] or BENCHMARK_SIZES
+    results = run(sizes)
+    with open(output, "w") as file:
+        json.dump(results, file, indent=2)
+    for size, result in results["sizes"].items():
+        print(f"{size} records:")
+        for name, timing in result["timings"].items():
+            print(f"  {name:<24}{timing['median_ms']:>10.3f} ms")
@@ -0,0 +1,282 @@
+# Copyright 2021, Andres Fredes, <andres.hector.fredes@gmail.com>
+# 
+# This file is part of timesheet.
+# 
+#     timesheet is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+# 
+#     timesheet is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+# 
+#     You should have received a copy of the GNU General Public License
+#     along with timesheet.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Timesheet: task/project time keeping program.
+
+cli.py provides the command line interface of the timesheet program, for use
+from scripts, shell hooks and editors. It never imports PyQt5, so that each
+command starts and finishes quickly.
+"""
+
+import sys
+from datetime import datetime as dt
+from datetime import timedelta as delta
+
+from config import INSTRUMENT, ARCHIVE_AFTER_DAYS
+from database import connect
+from storage import (clock_in, clock_out, current_task_project, week_totals,
+                     window_totals, migrate, rebuild_totals, archive,
+                     Active_Task_Exception)
+
+USAGE = """usage: timesheet.py [command]
+
+Run without a command to start the GUI.
+
+commands:
+  in TASK PROJECT [NOTES]  clock in
+  out [NOTES]              clock out, replacing the notes if given
+  status                   show the running task
+  report [--from DATE [--to DATE]]
+                           show this week's totals, or those between the
+                           dates
+  rebuild-totals           recalculate the totals table from every record
+  import FILE              import records from a CSV or JSON Lines file
+  export FILE [OPTIONS]    export records to a CSV or JSON Lines file
+  breakdown PERIOD [task|project] [--from DATE] [--to DATE]
+                           show the time per task or project in each day,
+                           week or month, between the dates if given
+  archive [--before DATE]  move the records clocked in before DATE, or over
+                           a year ago, into an archive file for each year
+
+export options:
+  --from DATE              only records clocked in on or after DATE
+  --to DATE                only records clocked in before DATE
+  --task TASK              only records of TASK
+  --project PROJECT        only records of PROJECT
+"""
+# Arguments are parsed by hand, as importing argparse would take longer than
+# running any of the commands.
+
+
+def main(argv):
+    """Runs a single command.
+
+    Args:
+        argv (list): the command line arguments, excluding the program name.
+
+    Returns:
+        (int): exit status, 0 on success, 1 if the command could not be
+            carried out and 2 for invalid arguments.
+    """
+    command, args = argv[0], argv[1:]
+    if command in ("-h", "--help"):
+        print(USAGE)
+        return 0
+    func, min_args, max_args = COMMANDS.get(command, (None, 0, -1))
+    if not min_args <= len(args) <= max_args:
+        print(USAGE, file=sys.stderr)
+        return 2
+    db = connect()
+    try:
+        migrate(db)
+        return func(db, *args)
+    finally:
+        db.close()
+        if INSTRUMENT:
+            from instrument import write_log
+            write_log()
+
+
+def _clock_in(db, task, project, notes=""):
+    try:
+        clock_in(db, task, project, notes)
+    except Active_Task_Exception:
+        print("Already clocked in, clock out first", file=sys.stderr)
+        return 1
+    print(f"Clocked in: {task} - {project}")
+    return 0
+
+
+def _clock_out(db, notes=None):
+    if not clock_out(db, notes):
+        print("Not clocked in", file=sys.stderr)
+        return 1
+    print("Clocked out")
+    return 0
+
+
+def _status(db):
+    current = current_task_project(db)
+    if not current:
+        print("Not clocked in")
+        return 1
+    task, project, notes, time = current
+    print(f"{task} - {project} since {time}")
+    if notes:
+        print(notes)
+    return 0
+
+
+def _report(db, *options):
+    filters = _filters(options, DATE_OPTIONS)
+    if filters is None or "end" in filters and "start" not in filters:
+        print(USAGE, file=sys.stderr)
+        return 2
+    for item_type in ("task", "project"):
+        if filters:
+            start = filters["start"]
+            end = filters.get("end", dt.now())
+            print(
+                f"{item_type.title()} from {start:%d/%m/%y %H:%M} "
+                f"to {end:%d/%m/%y %H:%M}"
+            )
+            totals = window_totals(db, start, end, item_type)
+        else:
+            print(f"{item_type.title()} this week")
+            totals = week_totals(db, item_type)
+        for name, elapsed in totals:
+            print(f"  {_format_time(elapsed)}  {name}")
+    return 0
+
+
+def _rebuild(db):
+    rebuild_totals(db)
+    return 0
+
+
+def _import(db, filename):
+    # importer is only needed here, so is not imported at startup.
+    from importer import import_file, Import_Exception
+    def progress(count):
+        print(f"\rImported {count} records", end="", file=sys.stderr)
+    try:
+        count = import_file(db, filename, progress)
+    except (OSError, Import_Exception, Active_Task_Exception) as error:
+        print(f"\nImport failed: {error}", file=sys.stderr)
+        return 1
+    print(f"\rImported {count} records")
+    return 0
+
+
+def _export(db, filename, *options):
+    from exporter import export_file
+    filters = _filters(options, EXPORT_OPTIONS)
+    if filters is None:
+        print(USAGE, file=sys.stderr)
+        return 2
+    try:
+        count = export_file(db, filename, **filters)
+    except OSError as error:
+        print(f"Export failed: {error}", file=sys.stderr)
+        return 1
+    print(f"Exported {count} records")
+    return 0
+
+
+def _breakdown(db, period, *args):
+    # reports imports NumPy, which is slow to start, so only when needed.
+    from reports import breakdown, Session_Cache, PERIODS
+    item_type = "task"
+    if args and not args[0].startswith("--"):
+        item_type, args = args[0], args[1:]
+    filters = _filters(args, DATE_OPTIONS)
+    if (period not in PERIODS or item_type not in ("task", "project")
+            or filters is None):
+        print(USAGE, file=sys.stderr)
+        return 2
+    periods, names, totals = breakdown(
+        db,
+        period,
+        item_type,
+        cache=Session_Cache(),
+        **filters
+    )
+    for start, row in zip(periods, totals.tolist()):
+        if not any(row):
+            continue
+        print(start.strftime(PERIOD_FORMATS[period]))
+        for name, elapsed in zip(names, row):
+            if elapsed:
+                print(f"  {_format_time(delta(microseconds=elapsed))}  {name}")
+    return 0
+
+
+def _archive(db, *options):
+    filters = _filters(options, ARCHIVE_OPTIONS)
+    if filters is None:
+        print(USAGE, file=sys.stderr)
+        return 2
+    before = filters.get(
+        "before",
+        dt.now() - delta(days=ARCHIVE_AFTER_DAYS)
+    )
+    print(f"Archived {archive(db, before)} records")
+    return 0
+
+
+def _filters(options, allowed):
+    # Parses "--option value" pairs into keyword arguments, or returns None if
+    # they are invalid.
+    if len(options) % 2:
+        return None
+    filters = {}
+    for option, value in zip(options[::2], options[1::2]):
+        name = allowed.get(option)
+        if not name:
+            return None
+        if name in ("start", "end", "before"):
+            try:
+                value = dt.fromisoformat(value)
+            except ValueError:
+                print(f"Invalid date '{value}'", file=sys.stderr)
+                return None
+        filters[name] = value
+    return filters
+
+
+def _format_time(time):
+    minutes = int(time.total_seconds()) // 60
+    return f"{minutes // 60:>4}:{minutes % 60:02}"
+
+
+COMMANDS = {
+    "in": (_clock_in, 2, 3),
+    "out": (_clock_out, 0, 1),
+    "status": (_status, 0, 0),
+    "report": (_report, 0, 4),
+    "rebuild-totals": (_rebuild, 0, 0),
+    "import": (_import, 1, 1),
+    "export": (_export, 1, 9),
+    "breakdown": (_breakdown, 1, 6),
+    "archive": (_archive, 0, 2)
+}
+# command: (function, minimum arguments, maximum arguments)
+
+EXPORT_OPTIONS = {
+    "--from": "start",
+    "--to": "end",
+    "--task": "task",
+    "--project": "project"
+}
+# option: export_file() argument
+
+DATE_OPTIONS = {
+    "--from": "start",
+    "--to": "end"
+}
+# option: reports.breakdown() argument
+
+ARCHIVE_OPTIONS = {
+    "--before": "before"
+}
+# option: storage.archive() argument
+
+PERIOD_FORMATS = {
+    "day": "%A %d/%m/%y",
+    "week": "Week of %d/%m/%y",
+    "month": "%B %Y"
+}
@@ -0,0 +1,184 @@
+# Copyright 2021, Andres Fredes, <andres.hector.fredes@gmail.com>
+# 
+# This file is part of timesheet.
+# 
+#     timesheet is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+# 
+#     timesheet is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+# 
+#     You should have received a copy of the GNU General Public License
+#     along with timesheet.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Timesheet: task/project time keeping program.
+
+completion.py suggests task and project names as they are typed. The names
+are held in a Name_Index, which finds those starting with what has been typed
+and ranks them by how often and how recently each was clocked in. The GUI
+fills an index a page at a time in the background, and counts each clock in
+in it as it is made, so the suggestions are up to date without querying the
+database on each keystroke.
+"""
+
+import heapq
+from bisect import bisect_left, insort
+from math import log2
+
+from PyQt5.QtCore import Qt, QStringListModel
+from PyQt5.QtWidgets import QCompleter
+
+from config import COMPLETION_LIMIT, COMPLETION_HALF_LIFE_DAYS
+
+_LAST = "\U0010ffff"
+# Sorts after any text starting with the same prefix.
+
+_DAY = 24 * 60 * 60 * 10**6
+# A day in the units of storage.to_epoch().
+
+
+class Name_Index:
+    """The task or project names, with how often and when each was last
+    clocked in.
+
+    The names are kept sorted case insensitively, so that those starting
+    with a prefix are found by bisection. Each match is ranked by its uses,
+    with their weight halved for every half_life days since the name was last
+    used, so a name used often lately comes before one used more often long
+    ago. Ranked by the logarithm, the weights never overflow, and need not be
+    recalculated as time passes, so each name's rank is kept until it is
+    used again.
+
+    Args:
+        half_life (int): days after which the weight of past uses is halved.
+            Defaults to COMPLETION_HALF_LIFE_DAYS.
+    """
+    def __init__(self, half_life=COMPLETION_HALF_LIFE_DAYS):
+        self.half_life = half_life * _DAY
+        self.last_id = 0
+        # Id of the last name added from the database, after which the next
+        # page is fetched. See storage.names_page().
+        self._sorted = []
+        # (casefolded name, name) pairs
+        self._uses = {}
+        # [uses, last_used] by name
+        self._ranks = {}
+
+    def __len__(self):
+        return len(self._sorted)
+
+    def add(self, names):
+        """Adds names fetched from the database, or updates those already
+        added.
+
+        Args:
+            names (list): tuples of (id, name, uses, last_used), as from
+                storage.names_page().
+        """
+        added = []
+        for name_id, name, uses, last_used in names:
+            self.last_id = max(self.last_id, name_id)
+            last_used = last_used or 0
+            if name in self._uses:
+                known = self._uses[name]
+                known[0] = max(known[0], uses)
+                known[1] = max(known[1], last_used)
+            else:
+                self._uses[name] = [uses, last_used]
+                added.append((name.casefold(), name))
+            self._set_rank(name)
+        if added:
+            self._sorted.extend(added)
+            self._sorted.sort()
+
+    def use(self, name, time):
+        """Counts a clock in, adding the name if it is new.
+
+        Args:
+            name (str): the task or project clocked in.
+            time (int): time of clock in, as from storage.to_epoch().
+        """
+        if name in self._uses:
+            known = self._uses[name]
+            known[0] += 1
+            known[1] = max(known[1], time)
+        else:
+            self._uses[name] = [1, time]
+            insort(self._sorted, (name.casefold(), name))
+        self._set_rank(name)
+
+    def matches(self, prefix, limit=COMPLETION_LIMIT):
+        """Finds the best ranked names starting with a prefix, ignoring case.
+
+        Args:
+            prefix (str): the start of the name. Every name matches an empty
+                prefix.
+            limit (int): maximum number of names. Defaults to
+                COMPLETION_LIMIT.
+
+        Returns:
+            (list): the names, best ranked first, with equally ranked names
+                in alphabetical order.
+        """
+        key = prefix.casefold()
+        start = bisect_left(self._sorted, (key, ))
+        end = bisect_left(self._sorted, (key + _LAST, ), start)
+        return heapq.nlargest(
+            limit,
+            (name for _, name in self._sorted[start:end]),
+            key=self._ranks.__getitem__
+        )
+
+    def best(self, limit=COMPLETION_LIMIT):
+        """Gives the best ranked names with their uses, to be added to another
+        index, as when saved in a snapshot.
+
+        Args:
+            limit (int): maximum number of names. Defaults to
+                COMPLETION_LIMIT.
+
+        Returns:
+            (list): tuples as taken by add(), with ids of 0 so that an index
+                they are added to still fetches every page.
+        """
+        return [
+            (0, name) + tuple(self._uses[name])
+            for name in self.matches("", limit)
+        ]
+
+    def _set_rank(self, name):
+        uses, last_used = self._uses[name]
+        self._ranks[name] = log2(max(uses, 1)) + last_used / self.half_life
+
+
+class Name_Completer(QCompleter):
+    """Suggests the names of a Name_Index starting with the text typed into a
+    text box.
+
+    The suggestions are found by the index on each edit, rather than by Qt
+    filtering a model of every name, so the completer is cheap to create and
+    suggests names added to the index since.
+
+    Args:
+        index (Name_Index): the names to suggest.
+        text_box (QLineEdit): the text box to complete.
+    """
+    def __init__(self, index, text_box):
+        super().__init__(text_box)
+        self.index = index
+        self.names = QStringListModel(self)
+        self.setModel(self.names)
+        self.setCompletionMode(QCompleter.UnfilteredPopupCompletion)
+        self.setCaseSensitivity(Qt.CaseInsensitive)
+        self.popup().setFont(text_box.font())
+        text_box.textEdited.connect(self._update)
+        # QLineEdit shows the popup after emitting textEdited, so it shows
+        # the names found here.
+        text_box.setCompleter(self)
+
+    def _update(self, text):
+        self.names.setStringList(self.index.matches(text) if text else [])
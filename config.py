@@ -20,6 +20,8 @@
 config.py contains any configuration variables required by the program or its
 elements."""
 
+import os
+
 WINDOW = {
     "XPOS":500,
     "YPOS":500,
@@ -38,4 +40,130 @@ COLUMN_NAMES = [
     "Notes",
     "Time In",
     "Time Out"
-]
\ No newline at end of file
+]
+
+MIGRATION_CHUNK = 10000
+
+HISTORY_PAGE = 256
+
+DISPLAY_CACHE_SIZE = 4096
+
+FILTER_DELAY_MS = 300
+# Time after the last keystroke in the History search and filter boxes before
+# the records are fetched again.
+
+NAMES_PAGE = 2000
+# Number of task or project names fetched at a time for completion.
+
+COMPLETION_LIMIT = 12
+# Number of task or project names suggested while typing, and listed in the
+# Task_Clocker's comboboxes.
+
+COMPLETION_HALF_LIFE_DAYS = 30
+# Days after which the weight of a name's past uses in completion is halved.
+# See completion.Name_Index.
+
+TICK_MS = 1000
+# Interval between updates of the running record's elapsed time, and of the
+# totals it is added to.
+
+CLOCK_ACTION_BUDGET_MS = 50
+
+CLOCK_DURABILITY = "flush"
+# How far the GUI saves a clock action before returning to the user, with
+# the database written in the background. See journal.py. One of:
+#     "commit": the database is written first, with no journal.
+#     "fsync": the journal is synced to disk, surviving a power loss.
+#     "flush": the journal is handed to the OS, surviving a crash of the
+#         program but not of the machine, as with synchronous=normal.
+#     "memory": no journal, so actions not yet written are lost in a crash.
+
+CLOCK_JOURNAL = "clock.journal"
+
+CLOCK_WRITE_DELAY_MS = 100
+# Time the writer waits after an action for others to commit along with it.
+
+SNAPSHOT = "snapshot.json"
+# What the GUI shows on opening, saved on each clock action and on exit, so
+# that its first frame is drawn before the database is opened. See
+# snapshot.py.
+
+SNAPSHOT_DELAY_MS = 1000
+# Time after a clock action before the snapshot is saved, by which the totals
+# and lists it holds have been brought up to date.
+
+SQLITE_PRAGMAS = {
+    "journal_mode": "wal",
+    "synchronous": "normal",
+    "cache_size": -16000,
+    "mmap_size": 268435456,
+    "temp_store": "memory"
+}
+# Applied to every connection. A negative cache_size is in KiB, and mmap_size
+# is in bytes. synchronous=normal is durable across application crashes in WAL
+# mode, but may lose the last commit on power loss.
+
+IMPORT_BATCH = 50000
+
+EXPORT_CHUNK = 5000
+
+ARCHIVE_DIR = "archive/"
+# Where the yearly archives are kept, within the directory of the database
+# their records were moved from. See storage.archive().
+
+ARCHIVE_AFTER_DAYS = 365
+# Age of the records moved into the archives by the archive command.
+
+ARCHIVE_ATTACHED = 8
+# Archives attached to a connection at once. SQLite allows 10 by default.
+
+REPORT_CACHE = "sessions.npz"
+
+SYNTHETIC_YEARS = 10
+
+BENCHMARK_SIZES = [10000, 100000, 1000000]
+
+BENCHMARK_REPEATS = 20
+
+INSTRUMENT = os.environ.get("TIMESHEET_INSTRUMENT") == "1"
+# Collect timings for the Diagnostics dialog and log. See instrument.py.
+
+INSTRUMENT_WINDOW = 1000
+
+INSTRUMENT_LOG = "diagnostics.log"
+
+INSTRUMENT_LOG_SECONDS = 60
+
+INSTRUMENT_PROGRESS_STEPS = 1000
+
+STARTUP_TIME = os.environ.get("TIMESHEET_STARTUP_TIME") == "1"
+# Report the time the GUI takes to draw its first frame and to be up to date
+# with the database, then exit.
+
+SERVER = os.environ.get("TIMESHEET_SERVER")
+# URL of a timesheet service for the GUI to use in place of the database in
+# DATA_DIR, such as "http://localhost:8765". See service.py.
+
+SERVER_USER = os.environ.get("TIMESHEET_USER")
+# Name to use on the service. Defaults to the login name.
+
+SERVER_TIMEOUT = 10
+
+SERVICE_HOST = "127.0.0.1"
+
+SERVICE_TOKEN = os.environ.get("TIMESHEET_TOKEN")
+# Shared secret the service requires of every request, and remote.py sends,
+# if set. Without one, the service only listens on a loopback address. See
+# service.py.
+
+SERVICE_PORT = 8765
+
+SERVICE_DIR = "users/"
+
+SERVICE_READERS = 4
+
+SERVICE_MAX_BODY = 65536
+
+LOADTEST_CLIENTS = [1, 4, 16, 64]
+
+LOADTEST_ACTIONS = 4000
@@ -0,0 +1,73 @@
+# Copyright 2021, Andres Fredes, <andres.hector.fredes@gmail.com>
+# 
+# This file is part of timesheet.
+# 
+#     timesheet is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+# 
+#     timesheet is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+# 
+#     You should have received a copy of the GNU General Public License
+#     along with timesheet.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Timesheet: task/project time keeping program.
+
+database.py opens connections to the timesheet database. Every part of the
+program connects through here, so that each connection is configured the same
+way with the SQLITE_PRAGMAS set in config.py.
+"""
+
+import os, sqlite3
+
+from config import DATA_DIR, DB_FILENAME, SQLITE_PRAGMAS, INSTRUMENT
+
+
+def connect(filename=DATA_DIR + DB_FILENAME, read_only=False):
+    """Opens a connection to the database, creating its directory if needed.
+
+    Rows are returned as sqlite3.Row, foreign keys are enforced and each of
+    SQLITE_PRAGMAS is applied. If INSTRUMENT is set, every statement is timed.
+    See instrument.py.
+
+    Read only connections are intended for use alongside the main connection,
+    such as from worker threads. In WAL journal mode they read from the last
+    commit without blocking, or being blocked by, the main connection. The
+    database must already exist, and the journal mode is left as it is.
+
+    Args:
+        filename (str): the path/filename of the database to access/create.
+            Defaults to DATA_DIR + DB_FILENAME.
+        read_only (bool): open the database read only. Defaults to False.
+
+    Returns:
+        (sqlite3.Connection): the configured connection.
+    """
+    factory = sqlite3.Connection
+    if INSTRUMENT:
+        # Only imported when needed, to keep the command line quick to start
+        from instrument import Instrumented_Connection, hook
+        factory = Instrumented_Connection
+    if read_only:
+        db = sqlite3.connect(
+            f'file:{filename}?mode=ro',
+            uri=True,
+            factory=factory
+        )
+    else:
+        directory = os.path.dirname(filename)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        db = sqlite3.connect(filename, factory=factory)
+    if INSTRUMENT:
+        hook(db)
+    db.row_factory = sqlite3.Row
+    db.execute('pragma foreign_keys=on')
+    for pragma, value in SQLITE_PRAGMAS.items():
+        if not (read_only and pragma == "journal_mode"):
+            db.execute(f'pragma {pragma}={value}')
+    return db
@@ -0,0 +1,84 @@
+# Copyright 2021, Andres Fredes, <andres.hector.fredes@gmail.com>
+# 
+# This file is part of timesheet.
+# 
+#     timesheet is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+# 
+#     timesheet is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+# 
+#     You should have received a copy of the GNU General Public License
+#     along with timesheet.  If not, see <https://www.gnu.org/licenses/>.
+
+
+"""Timesheet: task/project time keeping program.
+
+exporter.py writes timesheet records out to CSV or JSON Lines files, in the
+same format read by importer.py. Records are written as they are read from the
+database, EXPORT_CHUNK at a time, so memory use does not grow with the number
+of records exported.
+"""
+
+import csv, json
+
+from config import EXPORT_CHUNK
+from storage import export_records
+
+FIELDS = ("task", "project", "notes", "time_in", "time_out")
+
+
+def export_file(db, filename, start=None, end=None, task=None, project=None,
+                progress=None, chunk_size=EXPORT_CHUNK):
+    """Exports every record matching the given filters. Files ending in
+    '.jsonl' or '.json' are written as JSON Lines, and any other as CSV with a
+    header row. See storage.export_records() for the filters.
+
+    Args:
+        db (sqlite3.Connection): open connection to the timesheet database.
+        filename (str): the path/filename of the file to write.
+        start (datetime.datetime): only records clocked in at or after this
+            time. Defaults to None.
+        end (datetime.datetime): only records clocked in before this time.
+            Defaults to None.
+        task (str): only records of this task. Defaults to None.
+        project (str): only records of this project. Defaults to None.
+        progress (function): called with the number of records exported so
+            far after each chunk. Defaults to None.
+        chunk_size (int): number of records read from the database at a time.
+
+    Returns:
+        (int): number of records exported.
+    """
+    count = 0
+    chunks = export_records(db, start, end, task, project, chunk_size)
+    with open(filename, "w", newline="", encoding="utf-8") as file:
+        if filename.endswith((".jsonl", ".json")):
+            write = _jsonl_writer(file)
+        else:
+            write = _csv_writer(file)
+        for chunk in chunks:
+            write(chunk)
+            count += len(chunk)
+            if progress:
+                progress(count)
+    return count
+
+
+def _csv_writer(file):
+    writer = csv.writer(file)
+    writer.writerow(FIELDS)
+    # None, the running task's time_out, is written as an empty field.
+    return writer.writerows
+
+
+def _jsonl_writer(file):
+    def write(chunk):
+        file.write("".join(
+            json.dumps(dict(zip(FIELDS, record))) + "\n" for record in chunk
+        ))
+    return write
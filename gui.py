@@ -20,30 +20,78 @@
 gui.py manages the graphical user interface of the timesheet program.
 """
 
+import getpass, logging
+from datetime import datetime as dt
+from datetime import timedelta as delta
+from time import perf_counter
+
+from PyQt5.QtCore import Qt, QTimer, pyqtSignal
+from PyQt5.QtGui import QFontDatabase
 from PyQt5.QtWidgets import (QHBoxLayout, QMainWindow, QTableView, QVBoxLayout,
-                             QWidget, QHeaderView)
+                             QWidget, QHeaderView, QApplication, QFileDialog,
+                             QMessageBox, QDialog, QPlainTextEdit)
 from custom_widgets import (Action, Label, RegEx_Validator, Text_Box, Combo_Box,
                             Button)
-from model import Model, Database, Empty_DB_Exception
-from config import WINDOW, DATA_DIR, DB_FILENAME
+import snapshot
+from database import connect
+from completion import Name_Index, Name_Completer
+from model import Model
+from storage import (Empty_DB_Exception, Active_Task_Exception, add_running,
+                     to_epoch)
+from remote import Remote_Exception
+from importer import import_file, Import_Exception
+from exporter import export_file
+from workers import Query_Pool
+from instrument import calls, phase, record, reset, summary, timed, write_log
+from config import (WINDOW, CLOCK_ACTION_BUDGET_MS, FILTER_DELAY_MS, TICK_MS,
+                    NAMES_PAGE, INSTRUMENT, INSTRUMENT_LOG_SECONDS, SERVER,
+                    SERVER_USER, SNAPSHOT_DELAY_MS, STARTUP_TIME)
+
+log = logging.getLogger(__name__)
 
 class UI(QMainWindow):
     """UI subclasses QMainWindow to produce the window and overall GUI.
     It has been written to conform to Qt's model/view architecture and is
-    intended to connect to a QSqlTableModel which manages the database
+    intended to connect to a QAbstractTableModel which manages the database
     interaction. It is built using PyQt5 elements, many of which have been
     subclassed in 'custom_widgets.py'
+
+    With a local database, the window's first frame is drawn from the
+    snapshot saved on the last clock action or exit, if there is one, and the
+    database is only opened once that frame has been painted. See
+    snapshot.py.
+
+    Args:
+        started (float): perf_counter() when the program started, from which
+            the time to the first frame is reported if STARTUP_TIME is set.
+            Defaults to None, for when the UI was created.
     """
-    def __init__(self):
+    _import_progressed = pyqtSignal(int)
+    # Carries import progress from the worker thread running the import.
+
+    def __init__(self, started=None):
         super().__init__()
         self.title = "Time Tracker"
+        self.importing = False
+        self.started = perf_counter() if started is None else started
+        self.first_frame = None
         self._init_DB()
         self._init_UI()
 
     def _init_DB(self):
-        db = Database(DATA_DIR + DB_FILENAME)
-        db.open()
-        self.model = Model(db)
+        self.snapshot = None
+        if SERVER:
+            user = SERVER_USER or getpass.getuser()
+            self.model = Model(SERVER, user)
+            self.title += f" - {user} at {SERVER}"
+        else:
+            self.snapshot = snapshot.load()
+            self.model = Model(snapshot=self.snapshot)
+        self.queries = Query_Pool(self.model.reader)
+        self.names = {"task": Name_Index(), "project": Name_Index()}
+        if self.snapshot:
+            for item_type, index in self.names.items():
+                index.add(self.snapshot["names"][item_type])
 
     def _init_UI(self):
         self.setWindowTitle(self.title)
@@ -55,10 +103,46 @@ class UI(QMainWindow):
         )
         self._add_menu()
         self._add_widgets()
+        self.snapshot_timer = QTimer(self)
+        self.snapshot_timer.setSingleShot(True)
+        self.snapshot_timer.setInterval(SNAPSHOT_DELAY_MS)
+        self.snapshot_timer.timeout.connect(self._save_snapshot)
+        if INSTRUMENT:
+            self.log_timer = QTimer(self)
+            self.log_timer.timeout.connect(write_log)
+            self.log_timer.start(INSTRUMENT_LOG_SECONDS * 1000)
+        self._load_names()
 
     def _add_menu(self):
         menu = self.menuBar()
-        file_menu = menu.addMenu("File")
+        file_menu = self.file_menu = menu.addMenu("File")
+        if not self.model.server:
+            # Both work on the local database directly
+            import_option = Action(
+                name='Import...',
+                window=self,
+                shortcut='Ctrl+I',
+                tip='Import records from a CSV or JSON Lines file',
+                func=self._import
+            )
+            file_menu.addAction(import_option)
+            export_option = Action(
+                name='Export...',
+                window=self,
+                shortcut='Ctrl+E',
+                tip='Export every record to a CSV or JSON Lines file',
+                func=self._export
+            )
+            file_menu.addAction(export_option)
+        if INSTRUMENT:
+            diagnostics_option = Action(
+                name='Diagnostics',
+                window=self,
+                shortcut='Ctrl+Shift+D',
+                tip='Show timings collected by instrument.py',
+                func=self._diagnostics
+            )
+            file_menu.addAction(diagnostics_option)
         exit_option = Action(
             name='Exit',
             window=self,
@@ -72,30 +156,266 @@ class UI(QMainWindow):
         self.central = QWidget()
         layout = QHBoxLayout()
 
-        if self.model.current_task_project():
-            clocker = Clock_Out(self, self.model)
-        else:
-            clocker = Task_Clocker(self, self.model)
-        layout.addLayout(clocker)
+        with phase("_add_widgets: clocker"):
+            self.clocker = self._new_clocker()
+            layout.addWidget(self.clocker)
         
-        self.history = History(self.model)
-        layout.addLayout(self.history)
+        with phase("_add_widgets: history"):
+            self.history = History(self.model)
+            layout.addLayout(self.history)
         
-        layout.addLayout(Totals_Box(self.model))
+        with phase("_add_widgets: totals"):
+            self.totals = Totals_Box(self.model, self.queries)
+            if self.snapshot:
+                self.totals.show_snapshot(self.snapshot["totals"])
+            else:
+                self.totals.refresh()
+            layout.addLayout(self.totals)
+        self.totals.elapsed.connect(self._show_elapsed)
+        self.model.saved.connect(self._saved)
+        self._import_progressed.connect(self._import_progress)
 
         self.central.setLayout(layout)
         self.setCentralWidget(self.central)
 
+    def _new_clocker(self):
+        if self.model.current_task_project():
+            clocker = Clock_Out(self, self.model)
+        else:
+            clocker = Task_Clocker(self, self.model)
+        clocker.setContentsMargins(0, 0, 0, 0)
+        panel = QWidget()
+        panel.setLayout(clocker)
+        return panel
+
+    @timed("refresh_UI")
     def refresh_UI(self):
-        """Clears all of the existing widgets within the UI and refreshes them,
-        ensuring that the correct ones are instantiated based on the state.
+        """Brings the UI up to date with the state of the model after a clock
+        in or out.
+
+        Only the Task_Clocker/Clock_Out panel is replaced, as which one is
+        shown depends on whether there is a currently running task. The
+        Totals_Box updates its own labels, and the History view is updated by
+        the model directly, so both are left in place.
+
+        <widget>.setParent(None) is Qt's way of deleting widgets, so the old
+        panel's child widgets are deleted along with it.
 
-        <widget>.setParent(None) is Qt's way of deleting widgets, and so
-        deleting the central widget causes deletions to cascade down the 
-        parent-child chain until the UI is clear.
+        Any task and project names added since they were last fetched, as
+        by the command line, are fetched in the background.
+
+        The snapshot is saved SNAPSHOT_DELAY_MS later, once the totals and
+        names have been fetched again.
+
+        A refresh taking longer than CLOCK_ACTION_BUDGET_MS is logged.
         """
-        self.central.setParent(None)
-        self._add_widgets()
+        start = perf_counter()
+        with phase("refresh_UI: new clocker"):
+            clocker = self._new_clocker()
+        with phase("refresh_UI: replace clocker"):
+            self.central.layout().replaceWidget(self.clocker, clocker)
+            self.clocker.setParent(None)
+            self.clocker = clocker
+        with phase("refresh_UI: totals"):
+            self.totals.refresh()
+        self._load_names()
+        self.snapshot_timer.start()
+        elapsed = (perf_counter() - start) * 1000
+        if elapsed > CLOCK_ACTION_BUDGET_MS:
+            log.warning(
+                "UI refresh took %.1fms (budget %dms)",
+                elapsed,
+                CLOCK_ACTION_BUDGET_MS
+            )
+
+    def _load_names(self, restart=False):
+        # Fetches the task and project names added since the last page, a page
+        # at a time. Restarting fetches every name again, updating their uses.
+        if not self.model.is_open():
+            return
+        if restart:
+            for index in self.names.values():
+                index.last_id = 0
+        after = {
+            item_type: index.last_id
+            for item_type, index in self.names.items()
+        }
+        backend = self.model.backend
+        self.queries.submit(
+            "names",
+            lambda db: {
+                item_type: backend.names_page(db, item_type, last_id)
+                for item_type, last_id in after.items()
+            },
+            self._add_names
+        )
+
+    def _add_names(self, pages):
+        for item_type, page in pages.items():
+            self.names[item_type].add(page)
+        clocker = self.clocker.layout()
+        if isinstance(clocker, Task_Clocker):
+            clocker.refresh_names()
+        if any(len(page) == NAMES_PAGE for page in pages.values()):
+            self._load_names()
+
+    def _show_elapsed(self, elapsed):
+        clocker = self.clocker.layout()
+        if isinstance(clocker, Clock_Out):
+            clocker.show_elapsed(elapsed)
+
+    def _save_snapshot(self):
+        if self.model.server or not self.model.is_open():
+            return
+        snapshot.save({
+            "current": self.model.current_task_project(),
+            "names": {
+                item_type: index.best()
+                for item_type, index in self.names.items()
+            },
+            "totals": self.totals.shown,
+            "history": self.model.first_page()
+        })
+
+    def paintEvent(self, event):
+        """Overloaded QMainWindow function, painting the window. Once the
+        first frame has been painted, a window drawn from the snapshot is
+        brought up to date with the database.
+
+        For Qt internal processing only.
+
+        Args:
+            event (QPaintEvent): the area to be painted.
+        """
+        super().paintEvent(event)
+        if self.first_frame is None:
+            self.first_frame = perf_counter()
+            QTimer.singleShot(0, self._reconcile)
+
+    def _reconcile(self):
+        if not self.model.is_open():
+            with phase("startup: open database"):
+                self.model.open()
+            self.refresh_UI()
+        if STARTUP_TIME:
+            self._report_startup()
+
+    def _report_startup(self):
+        # Waits for the background queries to be shown, then exits.
+        self.queries.wait()
+        QApplication.processEvents()
+        source = "snapshot" if self.snapshot else "database"
+        print(
+            f"First frame: {(self.first_frame - self.started) * 1000:.1f}ms "
+            f"(from the {source}), up to date: "
+            f"{(perf_counter() - self.started) * 1000:.1f}ms"
+        )
+        self.close()
+
+    def _saved(self, errors):
+        """Updates the totals once clock actions queued by the model have been
+        written to the database. A clock in refused by the database, as when
+        another task was clocked in from the command line meanwhile, is
+        reported and the clocker shown as the database has it.
+
+        Args:
+            errors (list): the exception of each action not written.
+        """
+        if errors:
+            _not_saved(self, "Another task is already running")
+            self.refresh_UI()
+        else:
+            self.totals.refresh()
+
+    def _import(self):
+        """Imports the records in a file chosen by the user. See
+        importer.import_file().
+
+        The import runs in the background through a writable connection of
+        its own. The window and the File menu are disabled meanwhile, with
+        progress shown in the status bar. The model is reloaded once, after
+        the import has finished or stopped at an invalid record.
+        """
+        filename, _ = QFileDialog.getOpenFileName(
+            self,
+            "Import records",
+            "",
+            "Timesheet records (*.csv *.jsonl *.json);;All files (*)"
+        )
+        if not filename:
+            return
+        # Migrated before importing, if still showing the snapshot
+        self.model.open()
+        self._set_importing(True)
+        self.statusBar().showMessage("Importing...")
+        progress = self._import_progressed.emit
+        self.queries.submit(
+            "import",
+            lambda _: _try_import(filename, progress),
+            self._imported,
+            self._imported
+        )
+
+    def _import_progress(self, count):
+        if self.importing:
+            self.statusBar().showMessage(f"Importing... {count} records")
+
+    def _imported(self, result):
+        # Given the number of records imported, or the error that stopped
+        # the import.
+        self._set_importing(False)
+        if isinstance(result, Exception):
+            self.statusBar().clearMessage()
+            QMessageBox.warning(self, "Import failed", str(result))
+        else:
+            self.statusBar().showMessage(f"Imported {result} records")
+        self.model.reload()
+        self.refresh_UI()
+        self._load_names(restart=True)
+
+    def _set_importing(self, importing):
+        self.importing = importing
+        self.central.setEnabled(not importing)
+        for action in self.file_menu.actions():
+            action.setEnabled(not importing)
+
+    def _export(self):
+        """Exports every record to a file chosen by the user. See
+        exporter.export_file().
+
+        The export runs in the background through a read only connection, so
+        the window can still be used meanwhile.
+        """
+        filename, _ = QFileDialog.getSaveFileName(
+            self,
+            "Export records",
+            "",
+            "CSV (*.csv);;JSON Lines (*.jsonl)"
+        )
+        if not filename:
+            return
+        self.statusBar().showMessage("Exporting...")
+        self.queries.submit(
+            "export",
+            lambda db: _try_export(db, filename),
+            self._exported,
+            self._export_failed
+        )
+
+    def _exported(self, result):
+        if isinstance(result, OSError):
+            self.statusBar().clearMessage()
+            QMessageBox.warning(self, "Export failed", str(result))
+        else:
+            self.statusBar().showMessage(f"Exported {result} records")
+
+    def _export_failed(self, error):
+        # Any other error than an OSError, such as a sqlite3.Error
+        self.statusBar().clearMessage()
+        QMessageBox.warning(self, "Export failed", str(error))
+
+    def _diagnostics(self):
+        Diagnostics(self).exec_()
 
     def _close(self):
         super().close()
@@ -110,8 +430,47 @@ class UI(QMainWindow):
         Args:
             event (QCloseEvent): This is automatically passed when the window is
                 closed.
+
+        The window is not closed while an import is running.
         """
-        self.model.db.close()
+        if self.importing:
+            self.statusBar().showMessage(
+                "Importing... the window can be closed once it has finished"
+            )
+            event.ignore()
+            return
+        self.queries.wait()
+        self.snapshot_timer.stop()
+        self._save_snapshot()
+        self.model.close()
+        write_log()
+
+
+def _try_import(filename, progress):
+    # Run in a worker thread, through a writable connection of its own, so
+    # errors are returned for the GUI to show.
+    db = connect()
+    try:
+        return import_file(db, filename, progress)
+    except (OSError, Import_Exception, Active_Task_Exception) as error:
+        return error
+    finally:
+        db.close()
+
+
+def _try_export(db, filename):
+    # Run in a worker thread, so an OSError is returned for the GUI to show.
+    try:
+        return export_file(db, filename)
+    except OSError as error:
+        return error
+
+
+def _not_saved(parent, error):
+    # Shown when a clock action could not be saved, by the timesheet service
+    # or the database
+    log.warning("Not saved: %s", error)
+    QMessageBox.warning(parent, "Not saved", str(error))
 
 
 class Task_Clocker(QVBoxLayout):
@@ -123,10 +482,13 @@ class Task_Clocker(QVBoxLayout):
     This section of the UI will be swapped with Clock_Out widget, depending on
     whether there is a currently running task.
 
+    Task and project names are suggested from the UI's Name_Index of each,
+    which is filled in the background and counts each clock in made here.
+
     Args:
         parent (QMainWindow): window widget that the Task_Clocker will be
             instantiated within.
-        model (QSqlTableModel): model that handles the saving and returning of
+        model (Model): model that handles the saving and returning of
             database information.
     """
     def __init__(self, parent, model):
@@ -138,10 +500,11 @@ class Task_Clocker(QVBoxLayout):
         title_label = Label(text="Task details:", style="bold")
         self.addWidget(title_label)
 
-        tasks, projects = model.tasks_projects()
-        self.task_box = Textbox_with_Combo(self, "Task", tasks)
+        self.task_box = Textbox_with_Combo(self, "Task", parent.names["task"])
         self.addLayout(self.task_box)
-        self.project_box = Textbox_with_Combo(self, "Project", projects)
+        self.project_box = Textbox_with_Combo(
+            self, "Project", parent.names["project"]
+        )
         self.addLayout(self.project_box)
         self.notes_box = Notes_Box()
         self.addLayout(self.notes_box)
@@ -154,12 +517,30 @@ class Task_Clocker(QVBoxLayout):
 
         self.addStretch(2)
 
+    def refresh_names(self):
+        """Lists the best ranked names again, as after more have been fetched.
+        """
+        self.task_box.refresh()
+        self.project_box.refresh()
+
     def _clock_in(self):
-        if self.fields_set():
+        if self._fields_set():
             task = self.task_box.text_box.text()
             project = self.project_box.text_box.text()
             notes = self.notes_box.text_box.text()
-            self.model.add(task, project, notes)
+            try:
+                self.model.add(task, project, notes)
+            except Remote_Exception as error:
+                _not_saved(self.parent, error)
+                return
+            except Active_Task_Exception:
+                # Clocked in meanwhile from the command line or another client
+                _not_saved(self.parent, "Another task is already running")
+                self.parent.refresh_UI()
+                return
+            now = to_epoch(dt.now())
+            self.parent.names["task"].use(task, now)
+            self.parent.names["project"].use(project, now)
             self.parent.refresh_UI()
         else:
             self.task_box._indicate_required()
@@ -179,13 +560,16 @@ class Textbox_with_Combo(QHBoxLayout):
     functionality to know when correct data has been either input into the
     text-box or selected from the combobox.
 
+    Names starting with what is typed are suggested below the textbox, and
+    the combobox lists the best ranked names. See completion.Name_Index.
+
     Args:
         parent (QMainWindow): window widget that this object will be
             instantiated within.
         item_type (str): the type of information to list on the label.
-        items (list): the options that will be presented in the combobox
+        index (Name_Index): the names to suggest.
     """
-    def __init__(self, parent, item_type, items):
+    def __init__(self, parent, item_type, index):
         super().__init__()
         self.parent = parent
         label = Label(text=f"{item_type}:")
@@ -196,11 +580,22 @@ class Textbox_with_Combo(QHBoxLayout):
         re = RegEx_Validator(pattern)
         self.text_box.setValidator(re)
         self.text_box.textChanged.connect(self._changed)
+        self.index = index
+        self.completer = Name_Completer(index, self.text_box)
         self.addWidget(self.text_box)
         or_label = Label(text="OR")
         self.addWidget(or_label)
-        combo = Combo_Box(items)
-        self.addWidget(combo)
+        self.combo = Combo_Box(index.matches(""), self._chosen)
+        self.addWidget(self.combo)
+
+    def refresh(self):
+        """Lists the best ranked names in the combobox again.
+        """
+        self.combo.clear()
+        self.combo.addItems(self.index.matches(""))
+
+    def _chosen(self, position):
+        self.text_box.setText(self.combo.itemText(position))
 
     def _changed(self):
         self.text_box.setStyleSheet('')
@@ -233,25 +628,156 @@ class Notes_Box(QHBoxLayout):
 class History(QVBoxLayout):
     """This is a subclassed QVBoxLayout used as a container for a QTableView
     that will be the user's primary way of viewing information from the attached
-    database model.
+    database model, with a search box and filters above it to narrow down the
+    records shown. Clicking a column's header sorts the records by it.
+
+    The records are fetched again once typing in the search box or filters
+    has paused for FILTER_DELAY_MS, rather than on every keystroke.
 
     Args:
-        model (QSqlTableModel): The data model to be viewed.
+        model (Model): The data model to be viewed.
     """
     def __init__(self, model):
         super().__init__()
         self.model = model
         label = Label(text="History")
         self.addWidget(label)
-        self.table = QTableView()
+        self.delay = QTimer()
+        self.delay.setSingleShot(True)
+        self.delay.setInterval(FILTER_DELAY_MS)
+        self.delay.timeout.connect(self._filter)
+        self._init_filters()
+        self.table = Counting_Table() if INSTRUMENT else QTableView()
         self._init_table()
 
+    def _init_filters(self):
+        self.search = self._filter_box("Search notes, tasks and projects")
+        self.addWidget(self.search)
+        filters = QHBoxLayout()
+        self.task = self._filter_box("Task")
+        self.project = self._filter_box("Project")
+        self.start = self._filter_box("From YYYY-MM-DD")
+        self.end = self._filter_box("To YYYY-MM-DD")
+        for box in (self.task, self.project, self.start, self.end):
+            filters.addWidget(box)
+        self.addLayout(filters)
+
+    def _filter_box(self, placeholder):
+        box = Text_Box(placeholder=placeholder)
+        box.setClearButtonEnabled(True)
+        box.textChanged.connect(lambda text: self.delay.start())
+        return box
+
     def _init_table(self):
         self.table.setModel(self.model)
         self.table.setColumnHidden(0, True)
         self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        # The hidden ID column, newest first, is the model's starting order
+        self.table.horizontalHeader().setSortIndicator(0, Qt.DescendingOrder)
+        self.table.setSortingEnabled(True)
+        self.table.horizontalHeader().sortIndicatorChanged.connect(
+            self._sorted
+        )
         self.addWidget(self.table)
 
+    def _sorted(self, column, order):
+        # Moves the indicator back from a column the model cannot sort by
+        column, descending = self.model.sort_column()
+        order = Qt.DescendingOrder if descending else Qt.AscendingOrder
+        header = self.table.horizontalHeader()
+        if (header.sortIndicatorSection(), header.sortIndicatorOrder()) != (
+                column, order):
+            header.setSortIndicator(column, order)
+
+    def _filter(self):
+        self.model.set_filters(
+            search=self.search.text(),
+            task=self.task.text().strip(),
+            project=self.project.text().strip(),
+            start=self._date(self.start),
+            end=self._date(self.end, days=1)
+        )
+
+    def _date(self, box, days=0):
+        # The box's date plus any days, or None if empty or not a valid date.
+        # The 'To' date includes the records clocked in on that day.
+        box.setStyleSheet('')
+        text = box.text().strip()
+        if not text:
+            return None
+        try:
+            return dt.fromisoformat(text) + delta(days=days)
+        except ValueError:
+            box.setStyleSheet('background-color:red')
+            return None
+
+
+class Counting_Table(QTableView):
+    """QTableView used by History if INSTRUMENT is set, which records the
+    number of Model.data() calls made in painting each frame.
+    """
+    def paintEvent(self, event):
+        """Overloaded QTableView function, painting the visible cells.
+
+        For Qt internal processing only.
+
+        Args:
+            event (QPaintEvent): the area to be painted.
+        """
+        before = calls("Model.data")
+        super().paintEvent(event)
+        record("Model.data calls per paint", calls("Model.data") - before)
+
+
+class Diagnostics(QDialog):
+    """Dialog showing the timings and counts collected by instrument.py, only
+    available from the File menu if INSTRUMENT is set.
+
+    Args:
+        parent (QMainWindow): window the dialog belongs to.
+    """
+    def __init__(self, parent):
+        super().__init__(parent)
+        self.setWindowTitle("Diagnostics")
+        self.resize(900, 600)
+        layout = QVBoxLayout()
+        self.text = QPlainTextEdit()
+        self.text.setReadOnly(True)
+        self.text.setFont(QFontDatabase.systemFont(QFontDatabase.FixedFont))
+        layout.addWidget(self.text)
+        buttons = QHBoxLayout()
+        buttons.addWidget(Button(text="Refresh", func=self._show))
+        buttons.addWidget(Button(text="Reset", func=self._reset))
+        layout.addLayout(buttons)
+        self.setLayout(layout)
+        self._show()
+
+    def _show(self):
+        self.text.setPlainText(self._format(summary()))
+
+    def _reset(self):
+        reset()
+        self._show()
+
+    @staticmethod
+    def _format(stats):
+        lines = [f"{'':<60}{'count':>8}{'p50':>10}{'p90':>10}{'p99':>10}"
+                 f"{'max':>10}"]
+        counters = stats.pop("counters")
+        for name, stat in stats.items():
+            lines.append(
+                f"{name[:59]:<60}{stat['count']:>8}{stat['p50']:>10.3f}"
+                f"{stat['p90']:>10.3f}{stat['p99']:>10.3f}{stat['max']:>10.3f}"
+            )
+            lines.append("    " + "  ".join(
+                f"{bucket}:{number}"
+                for bucket, number in stat["histogram"].items()
+            ))
+        lines.append("")
+        for name, number in sorted(counters.items()):
+            lines.append(f"{name[:59]:<60}{number:>8}")
+        return "\n".join(lines)
+
 
 class Clock_Out(QVBoxLayout):
     """This is a subclassed QVBoxLayout designed to hold the group of widgets
@@ -265,7 +791,7 @@ class Clock_Out(QVBoxLayout):
     Args:
         parent (QMainWindow): window widget that this object will be
             instantiated within.
-        model (QSqlTableModel): model that handles the saving and returning of
+        model (Model): model that handles the saving and returning of
             database information.
     """
     def __init__(self, parent, model):
@@ -281,6 +807,8 @@ class Clock_Out(QVBoxLayout):
         self.addWidget(task_label)
         time_label = Label(text=str(time))
         self.addWidget(time_label)
+        self.elapsed_label = Label(text="")
+        self.addWidget(self.elapsed_label)
 
         self.addStretch(1)
 
@@ -294,9 +822,29 @@ class Clock_Out(QVBoxLayout):
 
         self.addStretch(2)
 
+    def show_elapsed(self, elapsed):
+        """Shows the time elapsed since clocking in. See Totals_Box.elapsed.
+
+        Args:
+            elapsed (datetime.timedelta): the time, or None if not known.
+        """
+        text = ""
+        if elapsed is not None:
+            minutes, seconds = divmod(int(elapsed.total_seconds()), 60)
+            hours, minutes = divmod(minutes, 60)
+            text = f"Running for {hours}:{minutes:02}:{seconds:02}"
+        if self.elapsed_label.text() != text:
+            self.elapsed_label.setText(text)
+
     def _clock_out(self):
         notes = self.notes_box.text_box.text()
-        self.model.set_time_out(notes)
+        try:
+            self.model.set_time_out(notes)
+        except Remote_Exception as error:
+            _not_saved(self.parent, error)
+            return
+        except Active_Task_Exception:
+            _not_saved(self.parent, "Another task is already running")
         self.parent.refresh_UI()
 
 class Totals_Box(QVBoxLayout):
@@ -305,44 +853,134 @@ class Totals_Box(QVBoxLayout):
     task and project. All contained widgets are information bearing only, so
     does not invite any user interaction.
 
+    The time of closed records is queried in the background on refresh().
+    Once it arrives, the time of the running record is added to it every
+    TICK_MS, without querying again until the next refresh(), which follows
+    each clock action, or the end of the week. See storage.time_baseline().
+
     Args:
-        model (QSqlTableModel): the data model to source the time data from.
+        model (Model): the data model to source the time data from.
+        queries (Query_Pool): the pool to calculate the totals in.
     """
-    def __init__(self, model):
+    elapsed = pyqtSignal(object)
+    # Emitted on each tick with the time elapsed in the running record, or
+    # None if there is none.
+
+    def __init__(self, model, queries):
         super().__init__()
         self.model = model
+        self.queries = queries
+        self.baselines = None
+        self.ticker = QTimer()
+        self.ticker.setInterval(TICK_MS)
+        self.ticker.timeout.connect(self._tick)
         title = Label(text="Totals")
         self.addWidget(title)
         self.addStretch(1)
 
+        self.empty_label = Label(text="No timesheet details saved")
+        self.empty_label.hide()
+        self.addWidget(self.empty_label)
+        self.labels = []
+        for index in range(8):
+            style = "bold" if index % 2 == 0 else ""
+            new_label = Label(style=style)
+            new_label.hide()
+            self.labels.append(new_label)
+            self.addWidget(new_label)
+        self.addStretch(1)
+        self.shown = None
+
+    def refresh(self):
+        """Starts recalculating the totals of the most recent task and project.
+        Any earlier calculation still in progress is superseded.
+        """
+        self.queries.submit("totals", self._query, self._show)
+
+    def show_snapshot(self, totals_list):
+        """Shows the totals saved in a snapshot, until refresh() is called.
+        They are not ticked, as the time of the running record is not known.
+        See snapshot.py.
+
+        Args:
+            totals_list (list): text of the labels, or None if there are no
+                records.
+        """
+        self._show_labels(totals_list)
+
+    def _query(self, db):
+        # Run in a worker thread, with its connection
+        backend = self.model.backend
         try:
-            task, project = self.model.most_recent()
+            task, project = backend.most_recent(db)
         except Empty_DB_Exception:
-            label = Label(text="No timesheet details saved")
-            self.addWidget(label)
+            return None
+        return (
+            (task, backend.time_baseline(db, "task", task)),
+            (project, backend.time_baseline(db, "project", project))
+        )
+
+    def _show(self, baselines):
+        # Keeps the queried baselines and ticks from them.
+        self.baselines = baselines
+        if baselines is None:
+            self.ticker.stop()
+            self._show_labels(None)
+            self.elapsed.emit(None)
         else:
-            task_week, task_total = self.model.get_total_time("task", task)
-            project_week, project_total = self.model.get_total_time(
-                "project", project)
-            totals_list = self._format_labels(task, task_week, task_total)
-            totals_list.extend(
-                self._format_labels(project, project_week, project_total)
-            )
-            for text in totals_list:
-                style = "bold" if text in totals_list[::2] else ""
-                new_label = Label(text=text, style=style)
-                self.addWidget(new_label)
-        self.addStretch(1)
+            self.ticker.start()
+            self._update(dt.now())
+
+    def _tick(self):
+        # Queries the baselines again once the week they were queried in has
+        # ended, at most once a tick.
+        if self.baselines is None:
+            return
+        now = dt.now()
+        if to_epoch(now) >= self.baselines[0][1][4]:
+            self.baselines = None
+            self.refresh()
+        else:
+            self._update(now)
+
+    def _update(self, now):
+        # Adds the running record's time to the baselines.
+        totals_list = []
+        for item, baseline in self.baselines:
+            total, week = add_running(baseline, now)
+            totals_list.extend(Totals_Box._format_labels(item, week, total))
+        self._show_labels(totals_list)
+        time_in = self.baselines[0][1][2]
+        self.elapsed.emit(
+            None if time_in is None
+            else delta(microseconds=to_epoch(now) - time_in)
+        )
 
-    def _format_labels(self, item, week, total):
+    def _show_labels(self, totals_list):
+        # Sets the text of only those labels that have changed.
+        self.shown = totals_list
+        if totals_list is None:
+            self.empty_label.show()
+            for label in self.labels:
+                label.hide()
+            return
+        self.empty_label.hide()
+        for label, text in zip(self.labels, totals_list):
+            if label.text() != text:
+                label.setText(text)
+            label.show()
+
+    @staticmethod
+    def _format_labels(item, week, total):
         return [
             f"{item} this week",
-            f"{self._format_time(week)}",
+            f"{Totals_Box._format_time(week)}",
             f"{item} total",
-            f"{self._format_time(total)}"
+            f"{Totals_Box._format_time(total)}"
         ]
 
-    def _format_time(self, time):
+    @staticmethod
+    def _format_time(time):
         days = time.days
         hours = time.seconds // 3600
         day_string = f"Days: {days} " if days else ""
@@ -0,0 +1,148 @@
+# Copyright 2021, Andres Fredes, <andres.hector.fredes@gmail.com>
+# 
+# This file is part of timesheet.
+# 
+#     timesheet is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+# 
+#     timesheet is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+# 
+#     You should have received a copy of the GNU General Public License
+#     along with timesheet.  If not, see <https://www.gnu.org/licenses/>.
+
+
+"""Timesheet: task/project time keeping program.
+
+importer.py reads timesheet records from other programs' CSV or JSON Lines
+files into the database. Files are read one line at a time and written in
+batches of IMPORT_BATCH records, so memory use does not grow with the size of
+the file.
+
+Each record needs 'task', 'project' and 'time_in' fields, and may have 'notes'
+and 'time_out' fields. Times are ISO 8601 local times, such as
+'2021-08-01 09:30:00', or integer microseconds since the Unix epoch in JSON.
+An empty time_out marks the currently running task.
+"""
+
+import csv, json
+from datetime import datetime as dt
+
+from config import IMPORT_BATCH
+from storage import add_records, to_epoch
+
+
+def import_file(db, filename, progress=None, batch_size=IMPORT_BATCH):
+    """Imports every record in a CSV or JSON Lines file. Files ending in
+    '.jsonl' or '.json' are read as JSON Lines, and any other as CSV with a
+    header row.
+
+    Each batch is committed as it is written. If an invalid record is found,
+    the batches before it remain imported.
+
+    Args:
+        db (sqlite3.Connection): open connection to the timesheet database.
+        filename (str): the path/filename of the file to import.
+        progress (function): called with the number of records imported so
+            far after each batch. Defaults to None.
+        batch_size (int): number of records per transaction.
+
+    Raises:
+        Import_Exception: If a record is invalid.
+        Active_Task_Exception: If more than one record would be running.
+
+    Returns:
+        (int): number of records imported.
+    """
+    count = 0
+    with open(filename, newline="", encoding="utf-8") as file:
+        if filename.endswith((".jsonl", ".json")):
+            rows = _read_jsonl(file)
+        else:
+            rows = _read_csv(file)
+        for batch in _batches(_validate(rows), batch_size):
+            add_records(db, batch)
+            count += len(batch)
+            if progress:
+                progress(count)
+    return count
+
+
+def _read_csv(file):
+    # Line numbers start after the header row.
+    for line, row in enumerate(csv.DictReader(file), start=2):
+        yield line, row
+
+
+def _read_jsonl(file):
+    for line, text in enumerate(file, start=1):
+        if text.strip():
+            try:
+                yield line, json.loads(text)
+            except ValueError:
+                raise Import_Exception(line, "not valid JSON")
+
+
+def _validate(rows):
+    # Yields each row as a record for storage.add_records().
+    for line, row in rows:
+        if not isinstance(row, dict):
+            raise Import_Exception(line, "not a record")
+        task = _name(line, row, "task")
+        project = _name(line, row, "project")
+        notes = row.get("notes") or ""
+        time_in = _time(line, row.get("time_in"))
+        time_out = _time(line, row.get("time_out"))
+        if time_in is None:
+            raise Import_Exception(line, "time_in is missing")
+        if time_out is not None and time_out < time_in:
+            raise Import_Exception(line, "time_out is before time_in")
+        yield (task, project, str(notes), time_in, time_out)
+
+
+def _name(line, row, field):
+    name = row.get(field)
+    if not isinstance(name, str) or not name.strip():
+        raise Import_Exception(line, f"{field} is missing")
+    return name.strip()
+
+
+def _time(line, value):
+    if value is None or value == "":
+        return None
+    if isinstance(value, bool):
+        # A JSON true or false, which would otherwise be taken as an int
+        raise Import_Exception(line, f"invalid time '{value}'")
+    if isinstance(value, int):
+        return value
+    try:
+        return to_epoch(dt.fromisoformat(value))
+    except (TypeError, ValueError):
+        raise Import_Exception(line, f"invalid time '{value}'")
+
+
+def _batches(records, size):
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class Import_Exception(Exception):
+    """Raised for a record that cannot be imported.
+
+    Args:
+        line (int): line number of the record within the file.
+        message (str): what is wrong with the record.
+    """
+    def __init__(self, line, message):
+        super().__init__(f"Line {line}: {message}")
+        self.line = line
@@ -0,0 +1,299 @@
+# Copyright 2021, Andres Fredes, <andres.hector.fredes@gmail.com>
+# 
+# This file is part of timesheet.
+# 
+#     timesheet is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+# 
+#     timesheet is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+# 
+#     You should have received a copy of the GNU General Public License
+#     along with timesheet.  If not, see <https://www.gnu.org/licenses/>.
+
+
+"""Timesheet: task/project time keeping program.
+
+instrument.py collects timings and counts from a running program, to find
+what is slow on a user's machine. It is switched on by setting the
+environment variable TIMESHEET_INSTRUMENT=1, and otherwise costs next to
+nothing: the decorators return the undecorated function, phase() returns a
+shared do-nothing context, and database connections are left unhooked.
+
+Each measurement is kept in a rolling window of its last INSTRUMENT_WINDOW
+samples, summarised by summary() as percentiles and a histogram of power of
+two buckets. write_log() appends the summaries to the log file in DATA_DIR.
+"""
+
+import json, sqlite3, threading
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from datetime import datetime as dt
+from functools import wraps
+from time import perf_counter
+
+from config import (INSTRUMENT, INSTRUMENT_WINDOW, INSTRUMENT_LOG,
+                    INSTRUMENT_PROGRESS_STEPS, DATA_DIR)
+
+_samples = {}
+# name: deque of the last INSTRUMENT_WINDOW samples
+_totals = {}
+# name: number of samples ever recorded
+_counters = {}
+# name: running count, as from counted()
+_lock = threading.Lock()
+_local = threading.local()
+# The statement being executed by each thread, for the progress handler.
+
+_NO_PHASE = nullcontext()
+
+
+def record(name, value):
+    """Adds a sample to a measurement's rolling window.
+
+    Args:
+        name (str): name of the measurement.
+        value (float): the sample, in milliseconds for timings.
+    """
+    with _lock:
+        samples = _samples.get(name)
+        if samples is None:
+            samples = _samples[name] = deque(maxlen=INSTRUMENT_WINDOW)
+        samples.append(value)
+        _totals[name] = _totals.get(name, 0) + 1
+
+
+def _increment(name):
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + 1
+
+
+def calls(name):
+    """Returns a running count, as kept by counted().
+
+    Args:
+        name (str): name of the counter.
+
+    Returns:
+        (int): number of counted calls so far.
+    """
+    return _counters.get(name, 0)
+
+
+def timed(name):
+    """Decorator recording the time taken by each call of a function as a
+    sample of the named measurement, if instrumentation is on.
+
+    Args:
+        name (str): name of the measurement.
+    """
+    def decorator(func):
+        if not INSTRUMENT:
+            return func
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            start = perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                record(name, (perf_counter() - start) * 1000)
+        return wrapper
+    return decorator
+
+
+def counted(name):
+    """Decorator keeping a running count of the calls of a function, if
+    instrumentation is on. See calls().
+
+    Args:
+        name (str): name of the counter.
+    """
+    def decorator(func):
+        if not INSTRUMENT:
+            return func
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            _increment(name)
+            return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def phase(name):
+    """Returns a context manager that records the time taken by the code
+    within it, if instrumentation is on. For timing part of a function.
+
+    Args:
+        name (str): name of the measurement.
+    """
+    if not INSTRUMENT:
+        return _NO_PHASE
+    return _timed_phase(name)
+
+
+@contextmanager
+def _timed_phase(name):
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        record(name, (perf_counter() - start) * 1000)
+
+
+class Instrumented_Connection(sqlite3.Connection):
+    """sqlite3.Connection that times every execute() and executemany() call,
+    including those made through its cursors, used by database.connect() if
+    instrumentation is on.
+
+    SQLite runs a query up to its first row when it is executed, so a query's
+    time includes finding the first row but not fetching the rest.
+    """
+    def execute(self, sql, parameters=()):
+        """Executes and times a single statement.
+        """
+        return _timed_statement(super().execute, sql, parameters)
+
+    def executemany(self, sql, parameters):
+        """Executes and times a statement for each set of parameters.
+        """
+        return _timed_statement(super().executemany, sql, parameters)
+
+    def cursor(self, factory=None):
+        """Opens a cursor, which times its statements unless another factory
+        is given.
+        """
+        return super().cursor(factory or Instrumented_Cursor)
+
+
+class Instrumented_Cursor(sqlite3.Cursor):
+    """sqlite3.Cursor that times every execute() and executemany() call, as
+    returned by Instrumented_Connection.cursor().
+    """
+    def execute(self, sql, parameters=()):
+        """Executes and times a single statement.
+        """
+        return _timed_statement(super().execute, sql, parameters)
+
+    def executemany(self, sql, parameters):
+        """Executes and times a statement for each set of parameters.
+        """
+        return _timed_statement(super().executemany, sql, parameters)
+
+
+def _timed_statement(execute, sql, parameters):
+    _local.statement = _statement_name(sql)
+    _local.steps = 0
+    start = perf_counter()
+    try:
+        return execute(sql, parameters)
+    finally:
+        _finish_statement(start)
+
+
+def hook(db):
+    """Sets the trace and progress handlers of a connection, to count the
+    statements run by SQLite, including those run by sqlite3 itself such as
+    'begin' and 'commit', and the virtual machine steps each takes.
+
+    Args:
+        db (sqlite3.Connection): a newly opened connection.
+    """
+    db.set_trace_callback(_trace)
+    db.set_progress_handler(_progress, INSTRUMENT_PROGRESS_STEPS)
+
+
+def _trace(sql):
+    verb = sql.split(None, 1)[0].lower() if sql.strip() else "?"
+    _increment(f"sql statements: {verb}")
+
+
+def _progress():
+    _local.steps = getattr(_local, "steps", 0) + INSTRUMENT_PROGRESS_STEPS
+    return 0
+
+
+def _finish_statement(start):
+    elapsed = (perf_counter() - start) * 1000
+    record(f"sql: {_local.statement}", elapsed)
+    if _local.steps:
+        record(f"sql steps: {_local.statement}", _local.steps)
+
+
+def _statement_name(sql):
+    # Statements are told apart by their first 80 characters.
+    return " ".join(sql.split())[:80]
+
+
+def summary():
+    """Summarises the rolling window of each measurement.
+
+    Returns:
+        (dict): for each measurement name, a dict of:
+            - count(int): number of samples ever recorded
+            - window(int): number of samples summarised
+            - mean, p50, p90, p99, max(float): of the samples in the window
+            - histogram(dict): number of samples in the window up to each
+                power of two, such as "<=0.5", with "<=" omitted for 0
+        and a 'counters' entry holding each running count.
+    """
+    with _lock:
+        windows = {name: sorted(samples) for name, samples in _samples.items()}
+        totals = dict(_totals)
+        counters = dict(_counters)
+    result = {}
+    for name, samples in sorted(windows.items()):
+        size = len(samples)
+        histogram = {}
+        for value in samples:
+            bucket = _bucket(value)
+            histogram[bucket] = histogram.get(bucket, 0) + 1
+        result[name] = {
+            "count": totals[name],
+            "window": size,
+            "mean": round(sum(samples) / size, 4),
+            "p50": round(samples[size // 2], 4),
+            "p90": round(samples[size * 9 // 10], 4),
+            "p99": round(samples[size * 99 // 100], 4),
+            "max": round(samples[-1], 4),
+            "histogram": histogram
+        }
+    result["counters"] = counters
+    return result
+
+
+def _bucket(value):
+    if value <= 0:
+        return "0"
+    limit = 2.0 ** -10
+    while limit < value:
+        limit *= 2
+    return f"<={limit:g}"
+
+
+def reset():
+    """Discards every sample and count.
+    """
+    with _lock:
+        _samples.clear()
+        _totals.clear()
+        _counters.clear()
+
+
+def write_log(filename=DATA_DIR + INSTRUMENT_LOG):
+    """Appends the current summary() to the log file as a line of JSON, if
+    instrumentation is on.
+
+    Args:
+        filename (str): the path/filename of the log. Defaults to
+            DATA_DIR + INSTRUMENT_LOG.
+    """
+    if not INSTRUMENT:
+        return
+    entry = {"time": dt.now().isoformat(timespec="seconds")}
+    entry.update(summary())
+    with open(filename, "a", encoding="utf-8") as file:
+        file.write(json.dumps(entry) + "\n")
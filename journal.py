@@ -0,0 +1,254 @@
+# Copyright 2021, Andres Fredes, <andres.hector.fredes@gmail.com>
+# 
+# This file is part of timesheet.
+# 
+#     timesheet is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+# 
+#     timesheet is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+# 
+#     You should have received a copy of the GNU General Public License
+#     along with timesheet.  If not, see <https://www.gnu.org/licenses/>.
+
+
+"""Timesheet: task/project time keeping program.
+
+journal.py saves the GUI's clock actions without waiting on the database,
+which can take a noticeable time on a slow disk or a network home directory.
+Each action is queued in memory and, unless CLOCK_DURABILITY is "memory",
+appended to a journal file in DATA_DIR. A background thread writes the queue
+to the database, gathering the actions taken within CLOCK_WRITE_DELAY_MS of
+each other into a single transaction, then removes them from the journal.
+
+Any actions left in the journal by a program that stopped before writing them
+are queued again when the next Journal is opened. storage.write_actions()
+passes over actions that were written before, so none is written twice.
+"""
+
+import json, logging, os, sqlite3, threading
+from datetime import datetime as dt
+
+from config import (DATA_DIR, CLOCK_JOURNAL, CLOCK_DURABILITY,
+                    CLOCK_WRITE_DELAY_MS)
+from database import connect
+from instrument import phase
+from storage import to_epoch, write_actions
+
+log = logging.getLogger(__name__)
+
+
+class Journal:
+    """Queues clock actions for a background thread to write to the
+    database.
+
+    Args:
+        on_written (function): called from the writer thread after each
+            group commit, with the list of actions written and the list of
+            their results, as from storage.write_actions().
+        filename (str): the path/filename of the journal. Defaults to
+            DATA_DIR + CLOCK_JOURNAL.
+        durability (str): "fsync", "flush" or "memory". See
+            CLOCK_DURABILITY.
+        delay (int): milliseconds to wait for more actions before writing.
+        open_writer (function): opens the writer thread's connection.
+            Defaults to a connection to the database in DATA_DIR.
+    """
+    def __init__(self, on_written, filename=DATA_DIR + CLOCK_JOURNAL,
+                 durability=CLOCK_DURABILITY, delay=CLOCK_WRITE_DELAY_MS,
+                 open_writer=connect):
+        self.on_written = on_written
+        self.filename = filename
+        self.durability = durability
+        self.delay = delay / 1000
+        self.open_writer = open_writer
+        self._condition = threading.Condition()
+        # Guards the queue, the file and the state below
+        self._queue = []
+        self._file = None
+        self._closed = False
+        self._attempts = 0
+        self._failed = False
+        if durability != "memory":
+            self._queue = _read(filename)
+            self._file = open(filename, "a", encoding="utf-8")
+        self._thread = threading.Thread(
+            target=self._write_loop,
+            name="journal",
+            daemon=True
+        )
+        self._thread.start()
+
+    def clock_in(self, task, project, notes):
+        """Queues a clock in at the current time. See storage.clock_in().
+
+        Args:
+            task (str): User entered/chosen 'task' value
+            project (str): User entered/chosen 'project' value
+            notes (str): User entered 'notes' value
+
+        Returns:
+            (int): time of clock in, as from storage.to_epoch().
+        """
+        now = to_epoch(dt.now())
+        self._append(("in", task, project, notes, now))
+        return now
+
+    def clock_out(self, notes=None):
+        """Queues a clock out at the current time. See storage.clock_out().
+
+        Args:
+            notes (str): User updated 'notes' value. Defaults to None,
+                keeping the existing notes.
+
+        Returns:
+            (int): time of clock out, as from storage.to_epoch().
+        """
+        now = to_epoch(dt.now())
+        self._append(("out", notes, now))
+        return now
+
+    def latest(self):
+        """Gives the newest action not yet written, if any.
+
+        Returns:
+            (tuple): the action, as taken by storage.write_actions(), or None.
+        """
+        with self._condition:
+            return self._queue[-1] if self._queue else None
+
+    def pending(self):
+        """Gives the actions not yet written, oldest first.
+
+        Returns:
+            (list): the actions, as taken by storage.write_actions().
+        """
+        with self._condition:
+            return list(self._queue)
+
+    def wait(self):
+        """Blocks until every queued action has been written, or the writer
+        has failed to write them.
+        """
+        with self._condition:
+            attempts = self._attempts
+            self._condition.wait_for(
+                lambda: not self._queue or not self._thread.is_alive()
+                or self._failed and self._attempts > attempts
+            )
+
+    def close(self):
+        """Writes any queued actions and stops the writer. Actions that could
+        not be written are left in the journal for the next run.
+        """
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._thread.join()
+        if self._file:
+            self._file.close()
+        elif self._queue:
+            log.warning("%d clock actions not saved", len(self._queue))
+
+    def _append(self, action):
+        with self._condition:
+            if self._file:
+                self._file.write(json.dumps(action) + "\n")
+                self._file.flush()
+                if self.durability == "fsync":
+                    os.fsync(self._file.fileno())
+            self._queue.append(action)
+            self._condition.notify_all()
+
+    def _write_loop(self):
+        db = self.open_writer()
+        try:
+            while self._write_next(db):
+                pass
+        finally:
+            db.close()
+
+    def _write_next(self, db):
+        # Writes the queued actions in a group commit. Returns False once
+        # closed with nothing more to write.
+        with self._condition:
+            self._condition.wait_for(lambda: self._queue or self._closed)
+            if not self._queue:
+                return False
+            # Actions taken meanwhile are written in the same commit
+            self._condition.wait_for(lambda: self._closed, self.delay)
+            batch = list(self._queue)
+        try:
+            with phase("Journal: group commit"):
+                results = write_actions(db, batch)
+        except sqlite3.Error:
+            log.exception("Could not write %d clock actions", len(batch))
+            with self._condition:
+                self._attempts += 1
+                self._failed = True
+                self._condition.notify_all()
+                # Tried again after a delay, unless closing
+                self._condition.wait_for(lambda: self._closed, self.delay)
+                return not self._closed
+        with self._condition:
+            del self._queue[:len(batch)]
+            self._rewrite()
+            self._attempts += 1
+            self._failed = False
+            self._condition.notify_all()
+        self.on_written(batch, results)
+        return True
+
+    def _rewrite(self):
+        # Leaves only the actions still queued in the journal. They are
+        # written to a temporary file which then replaces it, so a crash
+        # meanwhile leaves the journal as it was, to be written again.
+        if not self._file:
+            return
+        temporary = self.filename + ".tmp"
+        with open(temporary, "w", encoding="utf-8") as file:
+            for action in self._queue:
+                file.write(json.dumps(action) + "\n")
+            file.flush()
+            if self.durability == "fsync":
+                os.fsync(file.fileno())
+        self._file.close()
+        os.replace(temporary, self.filename)
+        if self.durability == "fsync":
+            _sync_directory(self.filename)
+        self._file = open(self.filename, "a", encoding="utf-8")
+
+
+def _sync_directory(filename):
+    # Makes a file's replacement durable, where the system allows opening
+    # its directory.
+    try:
+        directory = os.open(os.path.dirname(filename) or ".", os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(directory)
+    except OSError:
+        pass
+    finally:
+        os.close(directory)
+
+
+def _read(filename):
+    # Returns the actions left in a journal, up to any line cut short by a
+    # crash.
+    actions = []
+    try:
+        with open(filename, encoding="utf-8") as file:
+            for line in file:
+                try:
+                    actions.append(tuple(json.loads(line)))
+                except ValueError:
+                    break
+    except FileNotFoundError:
+        pass
+    return actions
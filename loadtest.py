@@ -0,0 +1,213 @@
+# Copyright 2021, Andres Fredes, <andres.hector.fredes@gmail.com>
+# 
+# This file is part of timesheet.
+# 
+#     timesheet is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+# 
+#     timesheet is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+# 
+#     You should have received a copy of the GNU General Public License
+#     along with timesheet.  If not, see <https://www.gnu.org/licenses/>.
+
+
+"""Timesheet: task/project time keeping program.
+
+loadtest.py measures how many clock actions the timesheet service (see
+service.py) can take from clients at once. It starts a service on a free local
+port, in a temporary directory, then for each of LOADTEST_CLIENTS has that
+many clients clock in and out as fast as they can, each as a user of its own,
+sharing LOADTEST_ACTIONS actions between them. Results are written as JSON, so
+that they can be compared between runs:
+
+    python loadtest.py [OUTPUT] [CLIENTS ...]
+
+Each client keeps one connection open, as the GUI does. The clients all run
+in this process, so with many of them the results may be limited by the
+clients rather than the service.
+"""
+
+import asyncio, json, os, platform, socket, sqlite3, statistics, subprocess
+import sys, tempfile
+from datetime import datetime as dt
+from time import perf_counter, sleep
+
+from config import (LOADTEST_CLIENTS, LOADTEST_ACTIONS, SERVICE_HOST,
+                    SERVICE_READERS, SERVICE_TOKEN)
+
+SERVICE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "service.py")
+
+_AUTHORIZATION = (
+    f"Authorization: Bearer {SERVICE_TOKEN}\r\n" if SERVICE_TOKEN else ""
+)
+# The service is started with the same environment, so the same token.
+
+
+def run(clients=LOADTEST_CLIENTS, actions=LOADTEST_ACTIONS):
+    """Starts a service and loads it with each number of clients in turn.
+
+    Args:
+        clients (list): number of clients at once in each run.
+        actions (int): number of clock actions shared by the clients of each
+            run.
+
+    Returns:
+        (dict): the environment the service was run in, and the results for
+            each number of clients. See load().
+    """
+    results = {
+        "started": dt.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "readers": SERVICE_READERS,
+        "actions": actions,
+        "clients": {}
+    }
+    with tempfile.TemporaryDirectory() as directory:
+        port = _free_port()
+        service = subprocess.Popen(
+            [sys.executable, SERVICE, SERVICE_HOST, str(port)],
+            cwd=directory,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL
+        )
+        try:
+            _wait_for(port)
+            for count in clients:
+                results["clients"][str(count)] = asyncio.run(
+                    load(port, count, actions, f"load{count}-")
+                )
+        finally:
+            service.terminate()
+            service.wait()
+    return results
+
+
+async def load(port, clients, actions, prefix="load-"):
+    """Has a number of clients clock in and out at once, each as its own
+    user, until they have made the given number of clock actions between
+    them.
+
+    Args:
+        port (int): port of the service on SERVICE_HOST.
+        clients (int): number of clients.
+        actions (int): number of clock actions, rounded down to a whole
+            number of clock ins and outs for each client.
+        prefix (str): start of each client's user name.
+
+    Returns:
+        (dict): the number of actions made, the number that failed, the
+            actions per second and percentiles of the time each took.
+    """
+    cycles = max(actions // (2 * clients), 1)
+    connections = await asyncio.gather(*(
+        _connect(port, f"{prefix}{number}") for number in range(clients)
+    ))
+    times = []
+    failed = []
+    start = perf_counter()
+    await asyncio.gather(*(
+        _clock(connection, cycles, times, failed)
+        for connection in connections
+    ))
+    elapsed = perf_counter() - start
+    for _, writer, _ in connections:
+        writer.close()
+    times.sort()
+    return {
+        "actions": len(times),
+        "failed": len(failed),
+        "seconds": round(elapsed, 3),
+        "actions_per_s": round(len(times) / elapsed, 1),
+        "median_ms": round(statistics.median(times), 3),
+        "p99_ms": round(times[len(times) * 99 // 100], 3),
+        "max_ms": round(times[-1], 3)
+    }
+
+
+async def _connect(port, user):
+    # Opens a client's connection, and has the service create its database
+    # before any actions are timed.
+    reader, writer = await asyncio.open_connection(SERVICE_HOST, port)
+    connection = (reader, writer, user)
+    await _request(connection, "status", {})
+    return connection
+
+
+async def _clock(connection, cycles, times, failed):
+    for number in range(cycles):
+        for action, args in (
+            ("clock-in", {"task": f"Task {number % 7}", "project": "Load"}),
+            ("clock-out", {"notes": f"Cycle {number}"})
+        ):
+            start = perf_counter()
+            status = await _request(connection, action, args)
+            times.append((perf_counter() - start) * 1000)
+            if status != 200:
+                failed.append(status)
+
+
+async def _request(connection, action, args):
+    # Sends a request on a kept open connection, and returns the response's
+    # status once it has all been read.
+    reader, writer, user = connection
+    body = json.dumps(args).encode()
+    writer.write(
+        f"POST /users/{user}/{action} HTTP/1.1\r\n"
+        f"Host: {SERVICE_HOST}\r\n"
+        "Content-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"{_AUTHORIZATION}"
+        "\r\n".encode() + body
+    )
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode().partition(":")
+        if name.lower() == "content-length":
+            length = int(value)
+    await reader.readexactly(length)
+    return status
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind((SERVICE_HOST, 0))
+        return sock.getsockname()[1]
+
+
+def _wait_for(port, seconds=10):
+    # Waits until the service accepts connections.
+    deadline = perf_counter() + seconds
+    while True:
+        try:
+            socket.create_connection((SERVICE_HOST, port), 1).close()
+            return
+        except OSError:
+            if perf_counter() > deadline:
+                raise
+            sleep(0.05)
+
+
+if __name__ == '__main__':
+    output = sys.argv[1] if len(sys.argv) > 1 else "loadtest.json"
+    clients = [int(count) for count in sys.argv[2:]] or LOADTEST_CLIENTS
+    results = run(clients)
+    with open(output, "w") as file:
+        json.dump(results, file, indent=2)
+    for count, result in results["clients"].items():
+        print(
+            f"{count:>4} clients: {result['actions_per_s']:>9.1f} actions/s, "
+            f"median {result['median_ms']:.3f} ms, "
+            f"p99 {result['p99_ms']:.3f} ms, {result['failed']} failed"
+        )
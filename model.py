@@ -17,253 +17,601 @@
 
 """Timesheet: task/project time keeping program.
 
-model.py hosts the SQLITE3 / QtSql database model and any related classes
+model.py hosts the Qt model of the timesheet database. The database itself is
+managed in storage.py.
 """
 
-import os, sqlite3
-from PyQt5.QtSql import QSqlDatabase, QSqlTableModel
-from PyQt5.QtCore import Qt
-from datetime import datetime as dt
-from datetime import timedelta as delta
+import logging
+from array import array
+from collections import OrderedDict
+from itertools import islice
+from PyQt5.QtCore import (Qt, QAbstractTableModel, QModelIndex, pyqtSignal,
+                          pyqtSlot)
 
-from config import DATA_DIR, DB_FILENAME, COLUMN_NAMES
+import remote, storage
+from config import (COLUMN_NAMES, HISTORY_PAGE, DISPLAY_CACHE_SIZE,
+                    CLOCK_DURABILITY)
+from database import connect
+from instrument import counted
+from journal import Journal
+from storage import from_epoch, CLOCKED_IN_FORMAT
 
+log = logging.getLogger(__name__)
 
-class Model(QSqlTableModel):
-    """Model subclasses PyQt5's QSqlTableModel for ease of use with PyQt5's
+
+class Model(QAbstractTableModel):
+    """Model subclasses PyQt5's QAbstractTableModel for ease of use with PyQt5's
     views to display the database information. It is intended for use in a
     model/view architecture as per Qt standards.
     Database access is primarily managed using SQLITE3.
 
+    Records are shown newest first, and are fetched from the database a page
+    of HISTORY_PAGE records at a time as the view scrolls down to them. Each
+    page continues from the last record already fetched (keyset pagination),
+    so fetching a page costs the same however far down the history it is.
+
+    The fetched records are held in a History_Store, a column at a time,
+    without their notes. The notes of the last DISPLAY_CACHE_SIZE records
+    fetched are kept by id, and those of a row no longer kept are fetched
+    again along with the rest of its page when shown. See storage.notes().
+
+    The display text of recently shown records is cached by id, keeping up to
+    DISPLAY_CACHE_SIZE records, so repainting does not reformat any times.
+
+    The view can sort the records by any column but Notes, and filter them
+    with set_filters(). Both are done by SQLite as each page is fetched, so
+    that only the records shown are held. See storage.history_page().
+
+    If given a server, the records of the user are read from and written to
+    a timesheet service, through the functions of remote.py in place of
+    those of storage.py. See service.py.
+
+    Otherwise, unless CLOCK_DURABILITY is "commit", clock actions are queued
+    in a journal.Journal and written to the database in the background. The
+    fetched rows and current_task_project() show them straight away, and
+    'saved' is emitted once they are written. A new record is shown without
+    an id until then. Actions left in the journal by a previous run are
+    written before the model is used. Any the writer could not write yet are
+    shown with the first page of records.
+
+    Given a snapshot (see snapshot.py), the model shows its records and
+    current task without opening the database, until open() is called.
+
     Args:
-        database (QSqlDatabase): Database to connect to and model. 
-            This should be passed in by the hosting view.
+        server (str): address of a timesheet service. Defaults to None, for
+            the database in DATA_DIR.
+        user (str): name of the user on the service.
+        snapshot (dict): state to show until opened, as from snapshot.load().
+            Defaults to None, for opening straight away.
     """
-    def __init__(self, database):
-        super().__init__(db=database)
-        try:
-            os.mkdir(DATA_DIR)
-        except FileExistsError:
-            pass
-        self._connect()
-        self.db.execute(
-            'create table if not exists timesheet'
-            '(id integer primary key, '
-            'task text, '
-            'project text, '
-            'notes text, '
-            'time_in timestamp, '
-            'time_out timestamp)'
-        )
-        self.setTable('timesheet')
-        self.setEditStrategy(QSqlTableModel.OnManualSubmit)
-        self.select()
+    saved = pyqtSignal(list)
+    # Emitted once queued clock actions are written, with the error of each
+    # that could not be.
+
+    _written = pyqtSignal(object, object)
+    # Carries Journal.on_written() from the writer thread.
+
+    def __init__(self, server=None, user=None, snapshot=None):
+        super().__init__()
+        self.server = server
+        self.user = user
+        self.backend = remote if server else storage
+        self.db = None
         self.db_cols = {}
         for index, name in enumerate(COLUMN_NAMES):
             self.db_cols[name] = index
-            self.setHeaderData(index, Qt.Horizontal, name)
-        self.submitAll()
+        self._store = History_Store()
+        self._fetched_all = False
+        self._notes = {}
+        self._display = OrderedDict()
+        self._sort = ("id", True)
+        self._filters = {}
+        self.journal = None
+        self._current = None
+        if snapshot:
+            self._extend(snapshot["history"])
+            self._current = snapshot["current"]
+        else:
+            self._connect()
+
+
+
+    def open(self):
+        """Opens a model given a snapshot, replacing the records shown from it
+        with those in the database if any differ. Does nothing if already
+        open.
+        """
+        if self.is_open():
+            return
+        self._connect()
+        page = [
+            tuple(record) for record in self.backend.history_page(
+                self.db, HISTORY_PAGE, None, *self._sort, **self._filters
+            )
+        ]
+        self._fetched_all = len(page) < HISTORY_PAGE
+        page = self._with_pending(page)
+        if page != [self._record(row) for row in range(len(self._store))]:
+            self.beginResetModel()
+            self._store.clear()
+            self._display.clear()
+            self._extend(page)
+            self.endResetModel()
+
+
+
+    def is_open(self):
+        """Gives whether the database has been opened. See open().
+
+        Returns:
+            (bool): False while showing a snapshot.
+        """
+        return self.db is not None
 
 
 
     def _connect(self):
-        self.db = sqlite3.connect(
-            DATA_DIR + DB_FILENAME,
-            detect_types=(sqlite3.PARSE_DECLTYPES|sqlite3.PARSE_COLNAMES)
-        )
-        self.db.row_factory = sqlite3.Row
+        if self.server:
+            self.db = remote.connect(self.server, self.user)
+        else:
+            self.db = connect()
+        self.backend.migrate(self.db)
+        if not self.server and CLOCK_DURABILITY != "commit":
+            self._written.connect(self._on_written)
+            self.journal = Journal(self._written.emit)
+            self.journal.wait()
 
 
 
     def close(self):
-        """Safely close database before exiting.
+        """Safely close database before exiting, once any queued clock
+        actions have been written.
         """
-        self.db.close()
+        if self.journal:
+            self.journal.close()
+        if self.is_open():
+            self.db.close()
 
 
 
-    def add(self, task, project, notes):
-        """Adds a record into the database consisting of the provided parameters
-        and the additional defaults (id, time_in).
+    def reader(self):
+        """Opens another connection to the model's records, for reading from
+        another thread. See workers.Query_Pool.
+
+        Returns:
+            (sqlite3.Connection or remote.Remote): the new connection, which
+                is read only if to the local database.
+        """
+        if self.server:
+            return remote.connect(self.server, self.user)
+        return connect(read_only=True)
 
-        Uses datetime.min as a placeholder to represent an ongoing task.
-        This is referred to internally with the var 'active'.
 
-        On submission of the record, QSqlTableModel automatically triggers the
-        dataChanged() event, notifying the host view of the change.
+
+    def add(self, task, project, notes):
+        """Clocks in with the provided details. See storage.clock_in(), and
+        journal.Journal.clock_in() for a queued clock in.
+
+        The new record is inserted at the top of the fetched rows, notifying
+        the host view of the single new row.
 
         Args:
             task (str): User entered/chosen 'task' value
             project (str): User entered/chosen 'project' value
             notes (str): User entered 'notes' value
         """
-        now = dt.now()
-        active = dt.min
-        with self.db:
-            self.db.execute(
-                'insert into timesheet'
-                '(task, project, notes, time_in, time_out) '
-                'values (?, ?, ?, ?, ?)',
-                (task, project, notes, now, active)
+        self.open()
+        if self.journal:
+            record_id = None
+            now = self.journal.clock_in(task, project, notes)
+        else:
+            record_id, now = self.backend.clock_in(
+                self.db, task, project, notes
             )
-        self.submitAll()
+        if self._reordered("in"):
+            # The new record may be anywhere in the order, or not shown
+            self.reload()
+        elif len(self._store) or self._fetched_all:
+            # Otherwise the new record is picked up by the first fetchMore()
+            self.beginInsertRows(QModelIndex(), 0, 0)
+            self._store.insert(0, (record_id, task, project, notes, now, None))
+            self._keep_notes(self._row_key(0), notes)
+            self.endInsertRows()
 
 
 
     def set_time_out(self, notes):
-        """Finalises the currently active record, by substituting the
-        placeholder 'active' (datetime.min) with the current time.
+        """Clocks out of the currently active record. See
+        storage.clock_out(), and journal.Journal.clock_out() for a queued
+        clock out.
 
-        On submission of the record, QSqlTableModel automatically triggers the
-        dataChanged() event, notifying the host view of the change.
+        If the record has been fetched, the host view is notified of the
+        change to that row only.
 
         Args:
             notes (str): User updated 'notes' value - this will overwrite any
                 existing notes.
         """
-        now = dt.now()
-        active = dt.min
-        with self.db:
-            self.db.execute(
-                'update timesheet '
-                'set notes=(?), time_out=(?) '
-                'where time_out=(?)',
-                (notes, now, active)
+        self.open()
+        if self.journal:
+            now = self.journal.clock_out(notes)
+        else:
+            closed = self.backend.clock_out(self.db, notes)
+            if not closed:
+                return
+            _, notes, now = closed
+        if self._reordered("out"):
+            self.reload()
+            return
+        row = self._store.running_row()
+        if row is not None:
+            key = self._row_key(row)
+            self._store.set_time_out(row, now)
+            self._keep_notes(key, notes)
+            self._display.pop(key, None)
+            self.dataChanged.emit(
+                self.index(row, self.db_cols["Notes"]),
+                self.index(row, self.db_cols["Time Out"])
             )
-        self.submitAll()
 
 
 
-    def tasks_projects(self):
-        """Queries the database and returns sorted lists of all tasks and
-        projects respectively.
+    def _reordered(self, action):
+        # True if a clock action may move a record to another place in the
+        # order, or in or out of the filtered records, rather than just
+        # adding or changing the top row.
+        if action == "in":
+            return bool(self._filters) or self._sort != ("id", True)
+        return "search" in self._filters or self._sort[0] == "time_out"
+
+
+
+    @pyqtSlot(object, object)
+    def _on_written(self, actions, results):
+        # The queued clock actions have been written. New records are given
+        # their ids, or the history fetched again if they were not shown as
+        # written.
+        errors = [
+            result for result in results if isinstance(result, Exception)
+        ]
+        if errors or any(self._reordered(action[0]) for action in actions):
+            self.reload()
+        else:
+            for action, result in zip(actions, results):
+                if action[0] == "in":
+                    self._set_id(*result)
+        self.saved.emit(errors)
+
+
+
+    def _set_id(self, record_id, time_in):
+        row = self._store.new_row(time_in)
+        if row is not None:
+            key = self._row_key(row)
+            self._store.set_id(row, record_id)
+            self._keep_notes(record_id, self._notes.pop(key, ""))
+            self._display.pop(key, None)
+            self.dataChanged.emit(
+                self.index(row, self.db_cols["ID"]),
+                self.index(row, self.db_cols["ID"])
+            )
+
+
+
+    def _with_pending(self, page):
+        # The first page of records, with the clock actions still queued in
+        # the journal shown as they will be written. Only done unsorted and
+        # unfiltered, as the place of the records is otherwise not known until
+        # they are written.
+        if not self.journal or self._reordered("in"):
+            return page
+        page = [tuple(record) for record in page]
+        written = {record[4] for record in page}
+        for action in self.journal.pending():
+            if action[0] == "in":
+                _, task, project, notes, time_in = action
+                if time_in not in written:
+                    page.insert(0, (None, task, project, notes, time_in, None))
+            else:
+                _, notes, time_out = action
+                for row, record in enumerate(page):
+                    if record[5] is None:
+                        if notes is None:
+                            notes = record[3]
+                        page[row] = record[:3] + (notes, record[4], time_out)
+                        break
+        return page
+
+
+
+    def _extend(self, records):
+        # Adds records to the end of those fetched, keeping their notes.
+        self._store.extend(records)
+        self._notes.update(
+            (_key(record[0], record[4]), record[3]) for record in records
+        )
+        self._trim_notes()
+
+
+
+    def _keep_notes(self, key, notes):
+        self._notes.pop(key, None)
+        self._notes[key] = notes
+        self._trim_notes()
+
+
+
+    def _trim_notes(self):
+        # Drops the notes kept longest, beyond DISPLAY_CACHE_SIZE.
+        excess = len(self._notes) - DISPLAY_CACHE_SIZE
+        if excess > 0:
+            for record_id in list(islice(self._notes, excess)):
+                del self._notes[record_id]
+
+
+
+    def _record(self, row):
+        # The fetched record in a row, with its notes, fetching those of the
+        # row's page if they are no longer kept.
+        record = self._store[row]
+        key = self._row_key(row)
+        if key not in self._notes and self.is_open():
+            first = row - row % HISTORY_PAGE
+            ids = [
+                record_id for record_id in
+                self._store.ids[first:first + HISTORY_PAGE]
+                if record_id not in self._notes and record_id != _NULL
+            ]
+            for record_id, notes in self.backend.notes(self.db, ids).items():
+                self._keep_notes(record_id, notes)
+        return record[:3] + (self._notes.get(key, ""), ) + record[4:]
+
+
+
+    def _row_key(self, row):
+        # The key the notes and display cells of the record in a row are kept
+        # under. See _key().
+        record_id = self._store.ids[row]
+        if record_id == _NULL:
+            return _key(None, self._store.times_in[row])
+        return record_id
+
+
+
+    def reload(self):
+        """Drops every fetched record, so that the host view fetches the
+        history again from the top. Used after records have been written to
+        the database other than through the model, such as by an import.
+        """
+        self.beginResetModel()
+        self._store.clear()
+        self._fetched_all = False
+        self._display.clear()
+        self.endResetModel()
+
+
+
+    def set_filters(self, **filters):
+        """Shows only the records matching every given filter, fetching the
+        history again from the top if they have changed.
+
+        Args:
+            **filters: search, task, project, start and end, as taken by
+                storage.history_page(). Filters of None or '' are left out.
+        """
+        filters = {
+            name: value for name, value in filters.items()
+            if value is not None and value != ""
+        }
+        if filters != self._filters:
+            self._filters = filters
+            self.reload()
+
+
+
+    def sort_column(self):
+        """Gives the column that the records are sorted by.
 
         Returns:
             (tuple): tuple containing:
-                - tasks(list): all tasks, alpha-sorted
-                - projects(list): all projects, alpha-sorted
+                - column(int): the column's index
+                - descending(bool): True if sorted from highest to lowest
         """
-        tasks = set()
-        projects = set()
-        for row in self.db.execute(
-            'select all task, project from timesheet'
-        ):
-            if row:
-                tasks.add(row['task'])
-                projects.add(row['project'])
-        return sorted(tasks), sorted(projects)
+        sort, descending = self._sort
+        return (SORT_COLUMNS.index(sort), descending)
+
+
+
+    def tasks_projects(self):
+        """See storage.tasks_projects().
+        """
+        return self.backend.tasks_projects(self.db)
 
 
 
     def current_task_project(self):
-        """Queries the database and returns the details within the 'current'
-        record as denoted by the placeholder of time_out == datetime.min.
+        """See storage.current_task_project(). Clock actions not yet written
+        are taken into account, and the snapshot's current task is given
+        until opened.
+        """
+        if not self.is_open():
+            return self._current
+        latest = self.journal.latest() if self.journal else None
+        if latest is None:
+            return self.backend.current_task_project(self.db)
+        if latest[0] == "out":
+            return None
+        _, task, project, notes, time_in = latest
+        return (
+            task,
+            project,
+            notes,
+            from_epoch(time_in).strftime(CLOCKED_IN_FORMAT)
+        )
+
+
+
+    def first_page(self):
+        """Gives the newest records, as shown when neither sorted nor
+        filtered, for saving in a snapshot. See snapshot.save().
 
         Returns:
-            (tuple): tuple containing the below, or None:
-                - task(str): task name
-                - project(str): project name
-                - notes(str): notes
-                - time_in(str): time of clock in, in human-readable format
+            (list): up to HISTORY_PAGE records, newest first.
         """
-        active = dt.min
-        cursor = self.db.execute(
-            'select all task, project, notes, time_in from timesheet '
-            'where time_out=(?)',
-            (active, )
-        )
-        current_row = cursor.fetchone()
-        format = "%A  %d/%m/%y  %H:%M"
-        if current_row:
-            return (
-                current_row['task'],
-                current_row['project'],
-                current_row['notes'],
-                current_row['time_in'].strftime(format)
-            )
-        else:
-            return None
+        if (self._sort == ("id", True) and not self._filters
+                and (len(self._store) >= HISTORY_PAGE or self._fetched_all)):
+            return [
+                self._record(row)
+                for row in range(min(HISTORY_PAGE, len(self._store)))
+            ]
+        return [
+            tuple(record) for record in
+            self.backend.history_page(self.db, HISTORY_PAGE)
+        ]
 
 
 
     def most_recent(self):
-        """Queries the database and returns the most recent record, which may
-        or may not be currently active.
+        """See storage.most_recent().
+        """
+        return self.backend.most_recent(self.db)
+
+
+
+    def get_total_time(self, item_type, item_name):
+        """See storage.get_total_time().
+        """
+        return self.backend.get_total_time(self.db, item_type, item_name)
+
+
 
-        Raises:
-            Empty_DB_Exception: In case of fresh install or deleted records.
+    def rowCount(self, parent=QModelIndex()):
+        """Overloaded QAbstractTableModel function giving the number of records
+        fetched so far.
+
+        For Qt internal model/view processing only.
+
+        Args:
+            parent (QModelIndex): always invalid, as the model is a flat table.
 
         Returns:
-            (tuple): tuple containing:
-                - task(str): task name
-                - project(str): project name
+            (int): number of fetched records
         """
-        cursor = self.db.execute(
-            'select all task, project from timesheet '
-            'order by id desc '
-        )
-        recent = cursor.fetchone()
-        if not recent:
-            raise Empty_DB_Exception()
-        return (recent['task'], recent['project'])
+        if parent.isValid():
+            return 0
+        return len(self._store)
 
 
 
-    def get_total_time(self, item_type, item_name):
-        """Provides total time elapsed for the chosen task or project (as
-        defined by parameters).
+    def columnCount(self, parent=QModelIndex()):
+        """Overloaded QAbstractTableModel function giving the number of columns.
+
+        For Qt internal model/view processing only.
 
         Args:
-            item_type (str): column to search (task or project)
-            item_name (str): keyword to search within column
+            parent (QModelIndex): always invalid, as the model is a flat table.
 
         Returns:
-            (tuple): tuple containing:
-                - total(datetime.timedelta): total time elapsed
-                - week_total(datetime.timedelta): time elapsed for this week
+            (int): number of columns
         """
-        cursor = self.db.execute(
-            'select all time_in, time_out from timesheet '
-            'where ?=(?)',
-            (item_type, item_name)
-        )
-        matching_rows = cursor.fetchall()
-        total = delta(microseconds=1)
-        week_total = delta(microseconds=1)
-        for row in matching_rows:
-            in_time = row['time_in']
-            out_time = row['time_out']
-            if out == dt.min:
-                out = dt.now()
-            total += (out_time - in_time)
-            week_total += self._time_in_week(in_time, out_time)
-        return (total, week_total)
-
-
-
-    def _time_in_week(in_time, out_time):
-        now = dt.now()
-        now_time = now.time()
-        week_start = now - delta(
-            days=now.weekday(),
-            hours=now_time.hour,
-            minutes=now_time.minute,
-            seconds=now_time.second,
-            microseconds=now_time.microsecond
+        if parent.isValid():
+            return 0
+        return len(COLUMN_NAMES)
+
+
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        """Overloaded QAbstractTableModel function providing the column names.
+
+        For Qt internal model/view processing only.
+
+        Args:
+            section (int): column or row number
+            orientation (enum): Qt horizontal or vertical header
+            role (enum): Qt values representing the type of interaction
+
+        Returns:
+            (str): the column name, or None if not for display.
+        """
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return COLUMN_NAMES[section]
+        return None
+
+
+
+    def canFetchMore(self, parent=QModelIndex()):
+        """Overloaded QAbstractTableModel function, telling the view whether
+        there are records still to be fetched.
+
+        For Qt internal model/view processing only.
+
+        Args:
+            parent (QModelIndex): always invalid, as the model is a flat table.
+
+        Returns:
+            (bool): True if there may be more records in the database, once
+                it has been opened
+        """
+        return not (
+            parent.isValid() or self._fetched_all or not self.is_open()
         )
-        if week_start < out_time:
-            if week_start < in_time:
-                diff = out_time - in_time
-            else:
-                diff = out_time - week_start
-        else:
-            diff = delta(microseconds=1)
-        return diff
+
+
+
+    def fetchMore(self, parent=QModelIndex()):
+        """Overloaded QAbstractTableModel function, fetching the next page of
+        records when the view scrolls to the end of those fetched.
+
+        For Qt internal model/view processing only.
+
+        Args:
+            parent (QModelIndex): always invalid, as the model is a flat table.
+        """
+        if parent.isValid():
+            return
+        last = self._store[-1] if len(self._store) else None
+        try:
+            page = self.backend.history_page(
+                self.db, HISTORY_PAGE, last, *self._sort, **self._filters
+            )
+        except remote.Remote_Exception:
+            # Tried again when the view next needs more records
+            log.exception("Could not fetch the history")
+            return
+        self._fetched_all = len(page) < HISTORY_PAGE
+        if last is None:
+            page = self._with_pending(page)
+        if page:
+            first = len(self._store)
+            self.beginInsertRows(QModelIndex(), first, first + len(page) - 1)
+            self._extend(page)
+            self.endInsertRows()
+
+
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        """Overloaded QAbstractTableModel function, sorting the records by a
+        column and fetching them again from the top. Columns that cannot be
+        sorted, as given by SORT_COLUMNS, are ignored. See sort_column().
+
+        For Qt internal model/view processing only.
+
+        Args:
+            column (int): index of the column to sort by.
+            order (enum): Qt ascending or descending order.
+        """
+        sort = SORT_COLUMNS[column]
+        if sort is None:
+            return
+        sort = (sort, order == Qt.DescendingOrder)
+        if sort != self._sort:
+            self._sort = sort
+            self.reload()
 
 
 
     def flags(self, index):
-        """Overloaded QSqlTableModel function to ensure that the view is
+        """Overloaded QAbstractTableModel function to ensure that the view is
         read-only.
 
         For Qt internal model/view processing only.
@@ -278,9 +626,10 @@ class Model(QSqlTableModel):
 
 
 
-    def data(self, index, role):
-        """Overloaded QSqlTableModel function to allow a Qt view correct access
-        to the model's contained data.
+    @counted("Model.data")
+    def data(self, index, role=Qt.DisplayRole):
+        """Overloaded QAbstractTableModel function to allow a Qt view correct
+        access to the model's contained data.
 
         For Qt internal model/view processing only.
 
@@ -292,33 +641,170 @@ class Model(QSqlTableModel):
         Returns:
             (QVariant): The record, or None if invalid or not for display.
         """
-        if role == Qt.DisplayRole:
-            record = QSqlTableModel.data(self, index, role)
-            if record:
-                if index.column() in [4, 5]:
-                    if "0001" in record:
-                        return "Running..."
-                    format = "%Y-%m-%d %H:%M:%S.%f"
-                    time = dt.strptime(record, format)
-                    out_format = "%H:%M  %d/%m/%y"
-                    record = time.strftime(out_format)
-                return record
+        if role == Qt.DisplayRole and index.isValid():
+            key = self._row_key(index.row())
+            cells = self._display.get(key)
+            if cells is None:
+                cells = _display_cells(self._record(index.row()))
+                self._display[key] = cells
+                if len(self._display) > DISPLAY_CACHE_SIZE:
+                    self._display.popitem(last=False)
+            else:
+                self._display.move_to_end(key)
+            return cells[index.column()]
         return None
-    
 
-class Database(QSqlDatabase):
-    """The SQLITE database with defined path/name.
 
-    Args:
-        filename (str): the path/filename of the database to access/create.
-    """
-    def __init__(self, filename):
-        super().__init__('QSQLITE')
-        self.setDatabaseName(filename)
+SORT_COLUMNS = ["id", "task", "project", None, "time_in", "time_out"]
+# The storage.HISTORY_SORTS key of each of COLUMN_NAMES, or None if the column
+# cannot be sorted.
+
+
+def _key(record_id, time_in):
+    # The key a record's notes and display cells are kept under: its id, or
+    # for a record not yet written, its time_in, which no other record has.
+    return ("new", time_in) if record_id is None else record_id
+
+
+def _display_cells(record):
+    # Formats a fetched record's times for display.
+    out_format = "%H:%M  %d/%m/%y"
+    time_in = from_epoch(record[4]).strftime(out_format)
+    if record[5] is None:
+        # An empty time_out is the currently active record
+        time_out = "Running..."
+    else:
+        time_out = from_epoch(record[5]).strftime(out_format)
+    return record[:4] + (time_in, time_out)
+
+
+_NULL = -2 ** 63
+# Held by a History_Store in place of an id or time_out of None.
+
 
+class History_Store:
+    """The records fetched by a Model, held a column at a time in arrays of
+    integers rather than as a tuple of Python objects each. Tasks and
+    projects are held as indexes into a list of their names, each kept once,
+    so a record takes 32 bytes however long its names. Notes are not held.
 
-class Empty_DB_Exception(Exception):
-    """Subclassed exception, for clarity of code.
-    No additional functionality.
+    Records are added as (id, task, project, notes, time_in, time_out)
+    tuples, as from storage.history_page(), and given back in the same form
+    with notes of None.
     """
-    pass
\ No newline at end of file
+    def __init__(self):
+        self.names = []
+        self._indexes = {}
+        self.clear()
+
+    def clear(self):
+        """Drops every record. The names are kept for those fetched again.
+        """
+        self.ids = array("q")
+        self.tasks = array("i")
+        self.projects = array("i")
+        self.times_in = array("q")
+        self.times_out = array("q")
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, row):
+        record_id = self.ids[row]
+        time_out = self.times_out[row]
+        return (
+            None if record_id == _NULL else record_id,
+            self.names[self.tasks[row]],
+            self.names[self.projects[row]],
+            None,
+            self.times_in[row],
+            None if time_out == _NULL else time_out
+        )
+
+    def extend(self, records):
+        """Adds records after those held.
+
+        Args:
+            records (list): the records, in order.
+        """
+        if not records:
+            return
+        ids, tasks, projects, _, times_in, times_out = zip(*records)
+        self.ids.extend(_nulled(ids))
+        self.tasks.extend(self._indexes_of(tasks))
+        self.projects.extend(self._indexes_of(projects))
+        self.times_in.extend(times_in)
+        self.times_out.extend(_nulled(times_out))
+
+    def insert(self, row, record):
+        """Adds a record before the one in a row.
+
+        Args:
+            row (int): row of the new record.
+            record (tuple): the record.
+        """
+        record_id, task, project, _, time_in, time_out = record
+        self.ids.insert(row, _NULL if record_id is None else record_id)
+        self.tasks.insert(row, self._index(task))
+        self.projects.insert(row, self._index(project))
+        self.times_in.insert(row, time_in)
+        self.times_out.insert(row, _NULL if time_out is None else time_out)
+
+    def running_row(self):
+        """Gives the row of the currently running record, if held.
+
+        Returns:
+            (int): the row, or None.
+        """
+        try:
+            return self.times_out.index(_NULL)
+        except ValueError:
+            return None
+
+    def new_row(self, time_in):
+        """Gives the row of a record not yet given an id, if held.
+
+        Args:
+            time_in (int): the record's time_in, as from storage.to_epoch().
+
+        Returns:
+            (int): the row, or None.
+        """
+        try:
+            first = self.ids.index(_NULL)
+        except ValueError:
+            return None
+        for row in range(first, len(self.ids)):
+            if self.ids[row] == _NULL and self.times_in[row] == time_in:
+                return row
+        return None
+
+    def set_id(self, row, record_id):
+        """Sets the id of the record in a row.
+        """
+        self.ids[row] = record_id
+
+    def set_time_out(self, row, time_out):
+        """Sets the time_out of the record in a row.
+        """
+        self.times_out[row] = time_out
+
+    def _index(self, name):
+        index = self._indexes.get(name)
+        if index is None:
+            index = self._indexes[name] = len(self.names)
+            self.names.append(name)
+        return index
+
+    def _indexes_of(self, names):
+        for name in set(names).difference(self._indexes):
+            self._index(name)
+        return map(self._indexes.__getitem__, names)
+
+
+def _nulled(values):
+    # The values with _NULL in place of None.
+    if None in values:
+        return [_NULL if value is None else value for value in values]
+    return values
+
@@ -0,0 +1,235 @@
+# Copyright 2021, Andres Fredes, <andres.hector.fredes@gmail.com>
+# 
+# This file is part of timesheet.
+# 
+#     timesheet is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+# 
+#     timesheet is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+# 
+#     You should have received a copy of the GNU General Public License
+#     along with timesheet.  If not, see <https://www.gnu.org/licenses/>.
+
+
+"""Timesheet: task/project time keeping program.
+
+remote.py gives the GUI the records of a user kept by a timesheet service
+(see service.py), in place of a local database. It has functions of the same
+name, arguments and results as those of storage.py that the GUI uses, each
+taking a Remote connection in place of a sqlite3.Connection, so that the Model
+can use either module as its backend.
+"""
+
+import http.client, json
+from datetime import timedelta as delta
+from urllib.parse import quote, urlsplit
+
+from config import NAMES_PAGE, SERVER_TIMEOUT, SERVICE_TOKEN
+from storage import Active_Task_Exception, Empty_DB_Exception
+
+
+class Remote:
+    """A connection to a timesheet service, acting for one user. Requests are
+    sent over a single HTTP connection, kept open between them, so a Remote
+    should only be used by one thread at a time.
+
+    The service is reached over HTTPS if the address starts with "https://",
+    such as through a proxy in front of it, or over plain HTTP for "http://".
+
+    Args:
+        url (str): address of the service, such as "http://localhost:8765".
+        user (str): name of the user.
+        token (str): the service's shared secret, or None if it has none.
+            Defaults to SERVICE_TOKEN.
+
+    Raises:
+        Remote_Exception: If the address is neither http:// nor https://.
+    """
+    def __init__(self, url, user, token=SERVICE_TOKEN):
+        address = urlsplit(url)
+        if address.scheme not in _CONNECTIONS:
+            raise Remote_Exception(f"Not an http or https address: {url}")
+        self.connection, default_port = _CONNECTIONS[address.scheme]
+        self.host = address.hostname
+        self.port = address.port or default_port
+        self.path = f"/users/{quote(user)}/"
+        self.headers = {"Content-Type": "application/json"}
+        if token is not None:
+            self.headers["Authorization"] = f"Bearer {token}"
+        self.http = None
+
+    def call(self, action, **args):
+        """Asks the service to run an action.
+
+        Args:
+            action (str): name of the action. See service.ACTIONS.
+            **args: arguments of the action, which are sent as JSON.
+
+        Raises:
+            Active_Task_Exception: If already clocked in.
+            Empty_DB_Exception: If the user has no records.
+            Remote_Exception: If the service could not be reached or could
+                not run the action.
+
+        Returns:
+            The action's result, decoded from JSON.
+        """
+        body = json.dumps(args)
+        try:
+            if self.http is None:
+                self.http = self.connection(
+                    self.host, self.port, timeout=SERVER_TIMEOUT
+                )
+            self.http.request("POST", self.path + action, body, self.headers)
+            response = self.http.getresponse()
+            status = response.status
+            content = json.loads(response.read())
+        except (OSError, http.client.HTTPException, ValueError) as error:
+            # Reconnected on the next call
+            self.close()
+            raise Remote_Exception(f"{action}: {error}")
+        if status == http.client.CONFLICT:
+            raise Active_Task_Exception()
+        if status == http.client.NOT_FOUND and action == "most-recent":
+            raise Empty_DB_Exception()
+        if status != http.client.OK:
+            raise Remote_Exception(f"{action}: {content.get('error')}")
+        return content["result"]
+
+    def close(self):
+        """Closes the HTTP connection.
+        """
+        if self.http is not None:
+            self.http.close()
+            self.http = None
+
+
+class Remote_Exception(Exception):
+    """Raised when the service cannot be reached, or cannot run an action.
+    """
+    pass
+
+
+_CONNECTIONS = {
+    "http": (http.client.HTTPConnection, 80),
+    "https": (http.client.HTTPSConnection, 443)
+}
+# The connection class and default port of each URL scheme
+
+
+def connect(url, user):
+    """Opens a connection to a timesheet service. The service creates the
+    user's database when first used.
+
+    Args:
+        url (str): address of the service.
+        user (str): name of the user.
+
+    Returns:
+        (Remote): the connection.
+    """
+    return Remote(url, user)
+
+
+def migrate(remote):
+    """Does nothing, as the service migrates each database as it opens it.
+    """
+
+
+def clock_in(remote, task, project, notes):
+    """See storage.clock_in().
+    """
+    result = remote.call("clock-in", task=task, project=project, notes=notes)
+    return (result["id"], result["time_in"])
+
+
+def clock_out(remote, notes=None):
+    """See storage.clock_out().
+    """
+    result = remote.call("clock-out", notes=notes)
+    if result is None:
+        return None
+    return (result["id"], result["notes"], result["time_out"])
+
+
+def current_task_project(remote):
+    """See storage.current_task_project().
+    """
+    result = remote.call("status")
+    return tuple(result) if result else None
+
+
+def most_recent(remote):
+    """See storage.most_recent().
+    """
+    return tuple(remote.call("most-recent"))
+
+
+def tasks_projects(remote):
+    """See storage.tasks_projects().
+    """
+    return tuple(remote.call("tasks-projects"))
+
+
+def names_page(remote, item_type, after=0, limit=NAMES_PAGE):
+    """See storage.names_page().
+    """
+    return [
+        tuple(name) for name in remote.call(
+            "names", item_type=item_type, after=after, limit=limit
+        )
+    ]
+
+
+def get_total_time(remote, item_type, item_name):
+    """See storage.get_total_time().
+    """
+    result = remote.call(
+        "total-time", item_type=item_type, item_name=item_name
+    )
+    return (
+        delta(microseconds=result["total"]),
+        delta(microseconds=result["week"])
+    )
+
+
+def time_baseline(remote, item_type, item_name):
+    """See storage.time_baseline().
+    """
+    return tuple(remote.call(
+        "time-baseline", item_type=item_type, item_name=item_name
+    ))
+
+
+def week_totals(remote, item_type):
+    """See storage.week_totals().
+    """
+    return [
+        (name, delta(microseconds=elapsed))
+        for name, elapsed in remote.call("week-totals", item_type=item_type)
+    ]
+
+
+def history_page(remote, limit, last=None, sort="id", descending=True,
+                 search="", task=None, project=None, start=None, end=None):
+    """See storage.history_page(). Records are tuples rather than
+    sqlite3.Row.
+    """
+    page = remote.call(
+        "history", limit=limit, last=last, sort=sort, descending=descending,
+        search=search, task=task, project=project,
+        start=start.isoformat() if start else None,
+        end=end.isoformat() if end else None
+    )
+    return [tuple(record) for record in page]
+
+
+def notes(remote, ids):
+    """See storage.notes().
+    """
+    return dict(remote.call("notes", ids=ids))
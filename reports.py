@@ -0,0 +1,383 @@
+# Copyright 2021, Andres Fredes, <andres.hector.fredes@gmail.com>
+# 
+# This file is part of timesheet.
+# 
+#     timesheet is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+# 
+#     timesheet is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+# 
+#     You should have received a copy of the GNU General Public License
+#     along with timesheet.  If not, see <https://www.gnu.org/licenses/>.
+
+
+"""Timesheet: task/project time keeping program.
+
+reports.py breaks the time recorded down by day, week or month, and by task or
+project. Every record in the report's range is loaded as NumPy arrays in a
+single query, and split at each day, week or month boundary it crosses by
+array operations rather than a loop per record.
+
+Period boundaries are local midnights, so a day may be 23 or 25 hours long
+where daylight saving time starts or ends.
+"""
+
+import itertools, os, threading
+from datetime import datetime as dt
+from datetime import timedelta as delta
+
+import numpy as np
+
+from config import DATA_DIR, REPORT_CACHE
+from storage import to_epoch, from_epoch, query_window, partitions
+
+PERIODS = ("day", "week", "month")
+
+
+def load_sessions(db, start=None, end=None, cache=None):
+    """Loads the records overlapping a time range as arrays, with the
+    currently running record treated as ending now.
+
+    Args:
+        db (sqlite3.Connection): open connection to the timesheet database.
+        start (int): only records ending after this time, as from to_epoch().
+            Defaults to None, for no limit.
+        end (int): only records starting before this time, as from
+            to_epoch(). Defaults to None, for no limit.
+        cache (Session_Cache): cache of the closed records to load from, if
+            any. Defaults to None, to load every record from the database.
+
+    Returns:
+        (tuple): tuple containing int64 arrays of:
+            - time_in(numpy.ndarray): clock in times
+            - time_out(numpy.ndarray): clock out times
+            - task_id(numpy.ndarray): task ids
+            - project_id(numpy.ndarray): project ids
+    """
+    now = to_epoch(dt.now())
+    if cache is None and start is not None:
+        # Only the records overlapping the range are read, through an index
+        cursor = db.cursor()
+        cursor.row_factory = None
+        rows = query_window(
+            cursor,
+            'select time_in, coalesce(time_out, :now), task_id, project_id '
+            'from window',
+            start,
+            now if end is None else end
+        )
+        return _columns(np.array(rows, dtype=np.int64).reshape(-1, 4))
+    if cache is None:
+        end = now if end is None else end
+        return _concatenate([
+            _fetch(
+                db,
+                'select time_in, coalesce(time_out, (?)), task_id, project_id '
+                f'from {schema}.timesheet where time_in<(?)',
+                (now, end)
+            )
+            for schema in partitions(db, end=end)
+        ])
+    running = _fetch(
+        db,
+        'select time_in, (?), task_id, project_id '
+        'from timesheet where time_out is null',
+        (now, )
+    )
+    columns = _concatenate([cache.sessions(db), running])
+    if start is None and end is None:
+        return columns
+    time_in, time_out = columns[0], columns[1]
+    keep = np.ones(len(time_in), dtype=bool)
+    if start is not None:
+        keep &= time_out > start
+    if end is not None:
+        keep &= time_in < end
+    return tuple(column[keep] for column in columns)
+
+
+def _fetch(db, query, params=()):
+    # Runs a query of four integer columns, returning an array of each.
+    cursor = db.cursor()
+    # Plain tuples are quicker to build than sqlite3.Row
+    cursor.row_factory = None
+    cursor.execute(query, params)
+    flat = np.fromiter(itertools.chain.from_iterable(cursor), dtype=np.int64)
+    return _columns(flat.reshape(-1, 4))
+
+
+def _columns(rows):
+    # Splits a 2D array of rows into an array of each column.
+    return tuple(np.ascontiguousarray(column) for column in rows.T)
+
+
+def _concatenate(parts):
+    # Joins the arrays of each column from a list of column tuples.
+    return tuple(np.concatenate(columns) for columns in zip(*parts))
+
+
+class Session_Cache:
+    """Keeps every closed record as arrays, saved to a file between runs, so
+    that a report only has to load the records added or closed since the
+    last. Loading a million records from SQLite takes around a second, while
+    the arrays load from the file in milliseconds.
+
+    Closed records are never changed, so the cache is brought up to date by
+    loading the closed records with a higher id than any seen before, and
+    those that were running when last seen. If the last record seen has
+    changed, or the number of records then differs from the database, such as
+    after records were deleted, every record is loaded again.
+
+    Archived records stay in the cache as they were when loaded, and are
+    counted along with those in the database. Only a cache loaded from
+    nothing reads the archives.
+
+    Args:
+        filename (str): the path/filename of the cache file. Defaults to
+            REPORT_CACHE in DATA_DIR.
+    """
+    def __init__(self, filename=DATA_DIR + REPORT_CACHE):
+        self.filename = filename
+        self._lock = threading.Lock()
+        try:
+            with np.load(filename) as saved:
+                self.columns = tuple(saved[name] for name in _CACHE_COLUMNS)
+                self.last_id = int(saved["last_id"])
+                self.last_time_in = int(saved["last_time_in"])
+                self.running_ids = saved["running_ids"].tolist()
+        except (OSError, KeyError, ValueError):
+            self._clear()
+
+    def _clear(self):
+        self.columns = tuple(np.zeros(0, dtype=np.int64) for _ in range(4))
+        self.last_id = 0
+        self.last_time_in = 0
+        self.running_ids = []
+
+    def sessions(self, db):
+        """Brings the cache up to date and returns the closed records.
+
+        Args:
+            db (sqlite3.Connection): open connection to the timesheet database.
+
+        Returns:
+            (tuple): time_in, time_out, task_id and project_id arrays, as from
+                load_sessions().
+        """
+        with self._lock:
+            if self._update(db):
+                return self.columns
+            self._clear()
+            self._update(db)
+            return self.columns
+
+    def _update(self, db):
+        # Returns False if the cache no longer matches the database.
+        # Asked separately, as together SQLite would scan the whole table
+        last_id = db.execute(
+            'select coalesce(max(id), 0) from timesheet'
+        ).fetchone()[0]
+        count = db.execute('select count(*) from timesheet').fetchone()[0]
+        count += db.execute(
+            'select coalesce(sum(records), 0) from archives'
+        ).fetchone()[0]
+        if _time_in(db, self.last_id) != self.last_time_in:
+            # Not the database the cache was made from
+            return False
+        seen = ",".join(str(int(record_id)) for record_id in self.running_ids)
+        new = _fetch(
+            db,
+            'select time_in, time_out, task_id, project_id from timesheet '
+            'where id>(?) and time_out is not null '
+            'union all '
+            'select time_in, time_out, task_id, project_id from timesheet '
+            f'where id in ({seen}) and time_out is not null',
+            (self.last_id, )
+        )
+        if not self.last_id:
+            new = _concatenate([
+                _fetch(
+                    db,
+                    'select time_in, time_out, task_id, project_id '
+                    f'from {schema}.timesheet'
+                )
+                for schema in partitions(db) if schema != 'main'
+            ] + [new])
+        running_ids = [
+            row[0] for row in
+            db.execute('select id from timesheet where time_out is null')
+        ]
+        changed = len(new[0]) or running_ids != self.running_ids
+        self.columns = _concatenate([self.columns, new])
+        self.last_id = last_id
+        self.last_time_in = _time_in(db, last_id)
+        self.running_ids = running_ids
+        if len(self.columns[0]) + len(running_ids) != count:
+            return False
+        if changed:
+            self._save()
+        return True
+
+    def _save(self):
+        # Written to a temporary file first, so that a reader never sees half
+        # a file.
+        temporary = self.filename + ".tmp"
+        with open(temporary, "wb") as file:
+            np.savez(
+                file,
+                last_id=self.last_id,
+                last_time_in=self.last_time_in,
+                running_ids=np.array(self.running_ids, dtype=np.int64),
+                **dict(zip(_CACHE_COLUMNS, self.columns))
+            )
+        os.replace(temporary, self.filename)
+
+
+_CACHE_COLUMNS = ("time_in", "time_out", "task_id", "project_id")
+
+
+def _time_in(db, record_id):
+    # 0 if there is no such record, as for an empty database.
+    row = db.execute(
+        'select time_in from timesheet where id=(?)',
+        (record_id, )
+    ).fetchone()
+    return row[0] if row else 0
+
+
+def period_bounds(first, last, period):
+    """Lists the start of each period from the one containing first up to and
+    including the first period to start after last.
+
+    Args:
+        first (int): earliest time to cover, as from to_epoch().
+        last (int): latest time to cover, as from to_epoch().
+        period (str): "day", "week" or "month".
+
+    Returns:
+        (numpy.ndarray): int64 start times, as from to_epoch(), each period
+            ending where the next starts.
+    """
+    if period not in PERIODS:
+        raise ValueError(f"Unknown period: {period}")
+    moment = dt.combine(from_epoch(first).date(), dt.min.time())
+    if period == "week":
+        moment -= delta(days=moment.weekday())
+    elif period == "month":
+        moment = moment.replace(day=1)
+    bounds = [to_epoch(moment)]
+    while bounds[-1] <= last:
+        moment = _next_period(moment, period)
+        bounds.append(to_epoch(moment))
+    return np.array(bounds, dtype=np.int64)
+
+
+def _next_period(moment, period):
+    if period == "day":
+        return moment + delta(days=1)
+    if period == "week":
+        return moment + delta(weeks=1)
+    if moment.month == 12:
+        return moment.replace(year=moment.year + 1, month=1)
+    return moment.replace(month=moment.month + 1)
+
+
+def split_periods(time_in, time_out, bounds):
+    """Splits each record at every period boundary that it crosses.
+
+    Args:
+        time_in (numpy.ndarray): clock in times.
+        time_out (numpy.ndarray): clock out times.
+        bounds (numpy.ndarray): period start times, covering every record.
+            See period_bounds().
+
+    Returns:
+        (tuple): tuple containing arrays with an element per piece of a
+        record:
+            - record(numpy.ndarray): index of the record the piece is of
+            - period(numpy.ndarray): index of the period the piece is in
+            - elapsed(numpy.ndarray): int64 microseconds within the period
+    """
+    first = np.searchsorted(bounds, time_in, side="right") - 1
+    last = np.searchsorted(bounds, time_out, side="left") - 1
+    # A record ending exactly on a boundary has nothing in the next period
+    last = np.maximum(last, first)
+    pieces = last - first + 1
+    record = np.repeat(np.arange(len(time_in)), pieces)
+    # Numbers the pieces of each record from 0, to offset from its first
+    starts = np.cumsum(pieces) - pieces
+    offset = np.arange(len(record)) - np.repeat(starts, pieces)
+    period = first[record] + offset
+    begin = np.maximum(time_in[record], bounds[period])
+    end = np.minimum(time_out[record], bounds[period + 1])
+    return record, period, end - begin
+
+
+def breakdown(db, period="week", item_type="task", start=None, end=None,
+              cache=None):
+    """Totals the time recorded in each period for each task or project.
+
+    Records are clipped to the start and end of the report, and split at
+    period boundaries, so each period only counts the time within it.
+
+    Args:
+        db (sqlite3.Connection): open connection to the timesheet database.
+        period (str): "day", "week" or "month". Defaults to "week".
+        item_type (str): total by "task" or "project". Defaults to "task".
+        start (datetime.datetime): start of the report. Defaults to None, for
+            the first record.
+        end (datetime.datetime): end of the report. Defaults to None, for
+            now.
+        cache (Session_Cache): cache to load the closed records from.
+            Defaults to None, to load every record from the database.
+
+    Returns:
+        (tuple): tuple containing:
+            - periods(list): datetime.datetime start of each period
+            - names(list): alpha-sorted names of each task or project
+            - totals(numpy.ndarray): int64 microseconds elapsed, indexed by
+                [period, name]
+    """
+    if item_type not in ("task", "project"):
+        raise ValueError(f"Unknown item type: {item_type}")
+    start = None if start is None else to_epoch(start)
+    end = None if end is None else to_epoch(end)
+    time_in, time_out, task_id, project_id = load_sessions(
+        db,
+        start,
+        end,
+        cache
+    )
+    if start is not None:
+        time_in = np.maximum(time_in, start)
+    if end is not None:
+        time_out = np.minimum(time_out, end)
+    if not len(time_in):
+        return ([], [], np.zeros((0, 0), dtype=np.int64))
+    first = int(time_in.min())
+    # Records end just before their time_out, so a report ending at midnight
+    # has no period starting at midnight
+    bounds = period_bounds(first, max(int(time_out.max()) - 1, first), period)
+    record, piece_period, elapsed = split_periods(time_in, time_out, bounds)
+    item_id = (task_id if item_type == "task" else project_id)[record]
+    # Ids are small, so are looked up by position rather than sorted
+    ids = np.flatnonzero(np.bincount(item_id))
+    names = dict(db.execute(f'select id, name from {item_type}').fetchall())
+    order = sorted(ids.tolist(), key=lambda item: names[item])
+    rank = np.zeros(ids[-1] + 1, dtype=np.int64)
+    rank[order] = np.arange(len(ids))
+    # The time within one period never reaches 2**53 microseconds, so the
+    # float64 sums of bincount are exact.
+    cells = piece_period * len(ids) + rank[item_id]
+    totals = np.bincount(
+        cells,
+        weights=elapsed,
+        minlength=(len(bounds) - 1) * len(ids)
+    ).astype(np.int64).reshape(len(bounds) - 1, len(ids))
+    periods = [from_epoch(int(bound)) for bound in bounds[:-1]]
+    return (periods, [names[item] for item in order], totals)
@@ -0,0 +1,376 @@
+# Copyright 2021, Andres Fredes, <andres.hector.fredes@gmail.com>
+# 
+# This file is part of timesheet.
+# 
+#     timesheet is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+# 
+#     timesheet is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+# 
+#     You should have received a copy of the GNU General Public License
+#     along with timesheet.  If not, see <https://www.gnu.org/licenses/>.
+
+
+"""Timesheet: task/project time keeping program.
+
+service.py serves the timesheets of a team over HTTP, so that everyone's
+records are kept in one place. The GUI uses it in place of a local database
+if TIMESHEET_SERVER is set. See remote.py. Run it with:
+
+    python service.py [HOST] [PORT]
+
+Requests are scoped to a single user by their path, and carry the action's
+arguments as a JSON object:
+
+    POST /users/NAME/ACTION
+
+The response is a JSON object holding either the 'result', or an 'error'
+along with a 4xx or 5xx status. See ACTIONS.
+
+The service trusts every client that holds its token to act as any user: the
+path names whose records are used, and is not checked against who sent the
+request. With SERVICE_TOKEN set (from TIMESHEET_TOKEN), a request without
+"Authorization: Bearer TOKEN" is refused with a 401 status. Without one, any
+client that can connect is trusted, so the service will only listen on a
+loopback address, for the users of this machine. The token is sent in the
+clear, so a service reached over an untrusted network should be put behind a
+proxy serving HTTPS.
+
+Each user's records are kept in a database of their own, in SERVICE_DIR
+within DATA_DIR, so that every query and index of storage.py is scoped to one
+user as it stands. Reads run on a pool of SERVICE_READERS threads, each with
+its own read only connection to each database, which WAL lets read alongside
+a write. Writes are queued for a single writer thread, holding the only
+writable connection to each database, so no write ever waits on SQLite's
+lock.
+"""
+
+import asyncio, hmac, ipaddress, json, logging, os, re, sys, threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime as dt
+from datetime import timedelta as delta
+from http import HTTPStatus
+from urllib.parse import unquote, urlsplit
+
+from config import (DATA_DIR, HISTORY_PAGE, NAMES_PAGE, SERVICE_DIR,
+                    SERVICE_HOST, SERVICE_PORT, SERVICE_READERS,
+                    SERVICE_MAX_BODY, SERVICE_TOKEN)
+from database import connect
+from storage import (clock_in, clock_out, current_task_project, most_recent,
+                     tasks_projects, names_page, get_total_time,
+                     time_baseline, week_totals, history_page, notes, migrate,
+                     HISTORY_SORTS, Active_Task_Exception, Empty_DB_Exception)
+
+log = logging.getLogger(__name__)
+
+_local = threading.local()
+# The connections of each reader thread, and of the writer thread.
+
+_PATH = re.compile(r"/users/(\w[\w.-]{0,63})/([a-z-]+)")
+# A user name is also its database's filename, so is kept to a safe subset.
+
+
+class Service:
+    """Runs the actions requested of the service against each user's
+    database.
+
+    Args:
+        directory (str): where the databases are kept. Defaults to DATA_DIR +
+            SERVICE_DIR.
+        readers (int): number of reader threads.
+        token (str): shared secret every request must carry, or None to
+            trust any client. Defaults to SERVICE_TOKEN.
+    """
+    def __init__(self, directory=DATA_DIR + SERVICE_DIR,
+                 readers=SERVICE_READERS, token=SERVICE_TOKEN):
+        self.directory = directory
+        self.token = token
+        self.readers = ThreadPoolExecutor(readers, "reader")
+        self.writer = ThreadPoolExecutor(1, "writer")
+        # Work given to the single writer thread is queued until it is free
+        self._ready = set()
+        # Users whose database has been created and migrated
+
+    async def run(self, user, action, args):
+        """Runs an action for a user, on the writer thread if it writes and
+        on a reader thread otherwise.
+
+        Args:
+            user (str): name of the user.
+            action (str): a key of ACTIONS.
+            args (dict): keyword arguments of the action.
+
+        Raises:
+            KeyError: If there is no such action.
+
+        Returns:
+            The action's result, which can be encoded as JSON.
+        """
+        func, writes = ACTIONS[action]
+        loop = asyncio.get_running_loop()
+        if user not in self._ready:
+            # Readers can only open a database that already exists
+            await loop.run_in_executor(self.writer, self._open, user)
+            self._ready.add(user)
+        executor = self.writer if writes else self.readers
+        return await loop.run_in_executor(
+            executor, self._call, user, not writes, func, args
+        )
+
+    def _open(self, user):
+        migrate(self._connection(user, read_only=False))
+
+    def _call(self, user, read_only, func, args):
+        return func(self._connection(user, read_only), **args)
+
+    def _connection(self, user, read_only):
+        # Each thread keeps a connection to each database it has used.
+        if not hasattr(_local, "connections"):
+            _local.connections = {}
+        db = _local.connections.get(user)
+        if db is None:
+            db = connect(
+                os.path.join(self.directory, f"{user}.db"),
+                read_only=read_only
+            )
+            _local.connections[user] = db
+        return db
+
+    async def serve(self, host=SERVICE_HOST, port=SERVICE_PORT):
+        """Answers HTTP requests until cancelled.
+
+        Args:
+            host (str): address to listen on.
+            port (int): port to listen on.
+
+        Raises:
+            ValueError: If listening on other than a loopback address without
+                a token.
+        """
+        if self.token is None and not _loopback(host):
+            raise ValueError(
+                f"Set TIMESHEET_TOKEN to serve on {host}, or any client "
+                "that can connect can use every timesheet"
+            )
+        server = await asyncio.start_server(self._client, host, port)
+        log.info("Serving on %s:%s", host, port)
+        async with server:
+            await server.serve_forever()
+
+    async def _client(self, reader, writer):
+        # Answers each request on a connection in turn, until either side
+        # closes it.
+        try:
+            while True:
+                request = await _read_request(reader)
+                if request is None:
+                    break
+                method, path, authorization, body, keep_alive = request
+                status, response = await self._respond(
+                    method, path, authorization, body
+                )
+                _write_response(writer, status, response, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except _Bad_Request as error:
+            _write_response(writer, error.status, {"error": str(error)}, False)
+        finally:
+            writer.close()
+
+    async def _respond(self, method, path, authorization, body):
+        if not self._authorized(authorization):
+            return HTTPStatus.UNAUTHORIZED, {"error": "Invalid token"}
+        match = _PATH.fullmatch(unquote(urlsplit(path).path))
+        if not match or match.group(2) not in ACTIONS:
+            return HTTPStatus.NOT_FOUND, {"error": "No such action"}
+        if method != "POST":
+            return HTTPStatus.METHOD_NOT_ALLOWED, {"error": "Use POST"}
+        try:
+            args = json.loads(body or b"{}")
+            if not isinstance(args, dict):
+                raise ValueError("Arguments must be a JSON object")
+            result = await self.run(match.group(1), match.group(2), args)
+        except Active_Task_Exception:
+            return HTTPStatus.CONFLICT, {"error": "Already clocked in"}
+        except Empty_DB_Exception:
+            return HTTPStatus.NOT_FOUND, {"error": "No records"}
+        except (TypeError, ValueError) as error:
+            return HTTPStatus.BAD_REQUEST, {"error": str(error)}
+        except Exception:
+            log.exception("%s failed", path)
+            return HTTPStatus.INTERNAL_SERVER_ERROR, {"error": "Failed"}
+        return HTTPStatus.OK, {"result": result}
+
+    def _authorized(self, authorization):
+        if self.token is None:
+            return True
+        # Compared in constant time, so the token cannot be found by timing
+        return hmac.compare_digest(
+            (authorization or "").encode("latin-1"),
+            f"Bearer {self.token}".encode()
+        )
+
+
+class _Bad_Request(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+async def _read_request(reader):
+    # Returns (method, path, authorization, body, keep_alive), or None once
+    # the client has closed the connection.
+    line = await reader.readline()
+    if not line:
+        return None
+    try:
+        method, path, version = line.decode("latin-1").split()
+    except ValueError:
+        raise _Bad_Request(HTTPStatus.BAD_REQUEST, "Malformed request")
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    try:
+        length = int(headers.get("content-length", 0))
+    except ValueError:
+        raise _Bad_Request(HTTPStatus.BAD_REQUEST, "Malformed Content-Length")
+    if length > SERVICE_MAX_BODY:
+        raise _Bad_Request(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "Too large")
+    body = await reader.readexactly(length) if length else b""
+    connection = headers.get("connection", "").lower()
+    if version == "HTTP/1.0":
+        keep_alive = connection == "keep-alive"
+    else:
+        keep_alive = connection != "close"
+    return method, path, headers.get("authorization"), body, keep_alive
+
+
+def _loopback(host):
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def _write_response(writer, status, response, keep_alive):
+    body = json.dumps(response).encode()
+    writer.write(
+        f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+        "Content-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+        "\r\n".encode("latin-1") + body
+    )
+
+
+def _micros(time):
+    return time // delta(microseconds=1)
+
+
+def _clock_in(db, task, project, notes=""):
+    record_id, time_in = clock_in(db, task, project, notes)
+    return {"id": record_id, "time_in": time_in}
+
+
+def _clock_out(db, notes=None):
+    closed = clock_out(db, notes)
+    if not closed:
+        return None
+    record_id, notes, time_out = closed
+    return {"id": record_id, "notes": notes, "time_out": time_out}
+
+
+def _status(db):
+    return current_task_project(db)
+
+
+def _most_recent(db):
+    return most_recent(db)
+
+
+def _tasks_projects(db):
+    return tasks_projects(db)
+
+
+def _names_page(db, item_type, after=0, limit=NAMES_PAGE):
+    return names_page(db, item_type, int(after), min(int(limit), NAMES_PAGE))
+
+
+def _total_time(db, item_type, item_name):
+    total, week = get_total_time(db, item_type, item_name)
+    return {"total": _micros(total), "week": _micros(week)}
+
+
+def _time_baseline(db, item_type, item_name):
+    return time_baseline(db, item_type, item_name)
+
+
+def _week_totals(db, item_type):
+    return [(name, _micros(time)) for name, time in week_totals(db, item_type)]
+
+
+def _history(db, limit=HISTORY_PAGE, last=None, sort="id", descending=True,
+             search="", task=None, project=None, start=None, end=None):
+    # Dates are sent as ISO 8601 text. Pages are kept to HISTORY_PAGE records.
+    if sort not in HISTORY_SORTS:
+        raise ValueError(f"Unknown sort: {sort}")
+    page = history_page(
+        db, min(int(limit), HISTORY_PAGE), last, sort, bool(descending),
+        search, task, project,
+        dt.fromisoformat(start) if start else None,
+        dt.fromisoformat(end) if end else None
+    )
+    return [tuple(record) for record in page]
+
+
+def _notes(db, ids):
+    # Sent as pairs, as JSON objects only have text keys. Kept to HISTORY_PAGE
+    # records, as pages are.
+    ids = [int(record_id) for record_id in ids[:HISTORY_PAGE]]
+    return list(notes(db, ids).items())
+
+
+ACTIONS = {
+    "clock-in": (_clock_in, True),
+    "clock-out": (_clock_out, True),
+    "status": (_status, False),
+    "most-recent": (_most_recent, False),
+    "tasks-projects": (_tasks_projects, False),
+    "names": (_names_page, False),
+    "total-time": (_total_time, False),
+    "time-baseline": (_time_baseline, False),
+    "week-totals": (_week_totals, False),
+    "history": (_history, False),
+    "notes": (_notes, False)
+}
+# action: (function taking a connection and the arguments, True if it writes)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 3:
+        print(__doc__.split("\n\n")[1], file=sys.stderr)
+        sys.exit(2)
+    logging.basicConfig(level=logging.INFO)
+    host = sys.argv[1] if len(sys.argv) > 1 else SERVICE_HOST
+    port = int(sys.argv[2]) if len(sys.argv) > 2 else SERVICE_PORT
+    try:
+        asyncio.run(Service().serve(host, port))
+    except ValueError as error:
+        print(error, file=sys.stderr)
+        sys.exit(2)
+    except KeyboardInterrupt:
+        pass
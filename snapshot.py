@@ -0,0 +1,95 @@
+# Copyright 2021, Andres Fredes, <andres.hector.fredes@gmail.com>
+# 
+# This file is part of timesheet.
+# 
+#     timesheet is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+# 
+#     timesheet is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+# 
+#     You should have received a copy of the GNU General Public License
+#     along with timesheet.  If not, see <https://www.gnu.org/licenses/>.
+
+
+"""Timesheet: task/project time keeping program.
+
+snapshot.py keeps a copy of what the GUI shows on opening: the running task,
+the best ranked task and project names, the totals and the first page of the
+History. The GUI draws its first frame from the snapshot before opening the
+database, and is then brought up to date from the database. See gui.UI.
+
+The snapshot is written to a temporary file which then replaces it, so a crash
+while saving leaves the one before.
+"""
+
+import json, logging, os
+
+from config import DATA_DIR, SNAPSHOT
+
+log = logging.getLogger(__name__)
+
+VERSION = 2
+# Snapshots saved in another format are ignored.
+
+
+def save(state, filename=DATA_DIR + SNAPSHOT):
+    """Saves a snapshot. Failing to is logged, as the GUI can start without
+    one.
+
+    Args:
+        state (dict): what the GUI shows, containing:
+            - current(tuple): as from storage.current_task_project()
+            - names(dict): best ranked names as from
+                completion.Name_Index.best(), by 'task' and 'project'.
+            - totals(list): text of the totals, or None if there are no
+                records. See gui.Totals_Box.
+            - history(list): the newest records, as from
+                storage.history_page().
+        filename (str): the path/filename of the snapshot. Defaults to
+            DATA_DIR + SNAPSHOT.
+    """
+    temporary = filename + ".tmp"
+    try:
+        with open(temporary, "w", encoding="utf-8") as file:
+            json.dump(dict(state, version=VERSION), file)
+        os.replace(temporary, filename)
+    except OSError:
+        log.exception("Could not save the snapshot")
+
+
+def load(filename=DATA_DIR + SNAPSHOT):
+    """Loads the saved snapshot.
+
+    Args:
+        filename (str): the path/filename of the snapshot. Defaults to
+            DATA_DIR + SNAPSHOT.
+
+    Returns:
+        (dict): the state, as given to save(), or None if there is no
+            snapshot that can be used.
+    """
+    try:
+        with open(filename, encoding="utf-8") as file:
+            state = json.load(file)
+        if state["version"] != VERSION:
+            return None
+        current = state["current"]
+        return {
+            "current": tuple(current) if current else None,
+            "names": {
+                item_type: [tuple(name) for name in state["names"][item_type]]
+                for item_type in ("task", "project")
+            },
+            "totals": state["totals"],
+            "history": [tuple(record) for record in state["history"]]
+        }
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, KeyError, TypeError):
+        log.warning("Ignored an unreadable snapshot", exc_info=True)
+        return None
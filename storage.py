@@ -0,0 +1,1736 @@
+# Copyright 2021, Andres Fredes, <andres.hector.fredes@gmail.com>
+# 
+# This file is part of timesheet.
+# 
+#     timesheet is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+# 
+#     timesheet is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+# 
+#     You should have received a copy of the GNU General Public License
+#     along with timesheet.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Timesheet: task/project time keeping program.
+
+storage.py holds the timesheet's database schema and every query and update
+made to it. It does not use Qt, so that it can be used without starting the
+GUI.
+
+Task and project names are stored once each in the 'task' and 'project' tables,
+and referred to by id from 'timesheet' and 'totals'. Times are stored as
+integer microseconds since the Unix epoch, so that SQLite can compare and
+subtract them directly. Use to_epoch() and from_epoch() to convert to and from
+local datetimes.
+
+Closed records can be moved out into a database file for each year by
+archive(), keeping the database itself small. The archives are attached read
+only as a query's time range needs them, and read alongside the database by
+the queries here, so archived records are still listed, searched, exported
+and reported on. See partitions().
+"""
+
+import os, sqlite3
+from datetime import datetime as dt
+from datetime import timedelta as delta
+
+from config import (MIGRATION_CHUNK, EXPORT_CHUNK, ARCHIVE_DIR,
+                    ARCHIVE_ATTACHED, NAMES_PAGE)
+
+SCHEMA_VERSION = 7
+
+_LEGACY_ACTIVE = 0
+# time_out of an ongoing task in SCHEMA_VERSION 1, replaced by NULL in 2.
+
+_RUNNING = 2 ** 63 - 1
+# Sorting value of the running task's empty time_out, after any other time.
+
+HISTORY_SORTS = {
+    "id": ("timesheet.id", 0),
+    "task": ("task.name", 1),
+    "project": ("project.name", 2),
+    "time_in": ("time_in", 4),
+    "time_out": (f"ifnull(time_out, {_RUNNING})", 5)
+}
+# sort: (SQL expression sorted by, index of its value in a history_page() row)
+# Each has an index in SCHEMA_VERSION 6. See _migrate_history().
+
+CLOCKED_IN_FORMAT = "%A  %d/%m/%y  %H:%M"
+# Time of clock in as given by current_task_project().
+
+
+def clock_in(db, task, project, notes, now=None):
+    """Adds a record into the database consisting of the provided parameters
+    and the additional defaults (id, time_in).
+
+    New task and project names are added to their tables, and the usage count
+    and last used time of existing ones are updated.
+
+    The time_out of an ongoing task is left empty (NULL). The partial index
+    'active_session' allows only one such record at a time.
+
+    The record is added to the 'search' index within the same transaction.
+
+    Args:
+        db (sqlite3.Connection): open connection to the timesheet database.
+        task (str): User entered/chosen 'task' value
+        project (str): User entered/chosen 'project' value
+        notes (str): User entered 'notes' value
+        now (int): time of clock in, as from to_epoch(). Defaults to None, for
+            the current time.
+
+    Raises:
+        Active_Task_Exception: If there is already a currently running task.
+
+    Returns:
+        (tuple): tuple containing:
+            - id(int): id of the new record
+            - time_in(int): time of clock in
+    """
+    if now is None:
+        now = to_epoch(dt.now())
+    try:
+        with db:
+            record_id = _clock_in(db, task, project, notes, now)
+    except sqlite3.IntegrityError:
+        raise Active_Task_Exception()
+    return (record_id, now)
+
+
+def _clock_in(db, task, project, notes, now):
+    # clock_in() within the caller's transaction, returning the new record id.
+    cursor = db.execute(
+        'insert into timesheet'
+        '(task_id, project_id, notes, time_in) '
+        'values (?, ?, ?, ?)',
+        (
+            _intern(db, 'task', task, now),
+            _intern(db, 'project', project, now),
+            notes,
+            now
+        )
+    )
+    _index_search(db, cursor.lastrowid - 1)
+    return cursor.lastrowid
+
+
+def clock_out(db, notes=None, now=None):
+    """Finalises the currently active record, by setting its empty time_out
+    to the current time.
+
+    The elapsed time of the finalised record is added to the 'totals' rollup
+    table within the same transaction, split across each week that the record
+    spans, and the longest record length is updated. See overlapping().
+
+    Args:
+        db (sqlite3.Connection): open connection to the timesheet database.
+        notes (str): User updated 'notes' value - this will overwrite any
+            existing notes. Defaults to None, keeping the existing notes.
+        now (int): time of clock out, as from to_epoch(). Defaults to None,
+            for the current time.
+
+    Returns:
+        (tuple): tuple containing the below, or None if no task was running:
+            - id(int): id of the finalised record
+            - notes(str): notes of the finalised record
+            - time_out(int): time of clock out
+    """
+    if now is None:
+        now = to_epoch(dt.now())
+    with db:
+        return _clock_out(db, notes, now)
+
+
+def _clock_out(db, notes, now):
+    # clock_out() within the caller's transaction.
+    current_row = db.execute(
+        'select id, task_id, project_id, notes, time_in from timesheet '
+        'where time_out is null'
+    ).fetchone()
+    if not current_row:
+        return None
+    if notes is None:
+        notes = current_row['notes']
+    db.execute(
+        'update timesheet '
+        'set notes=(?), time_out=(?) '
+        'where id=(?)',
+        (notes, now, current_row['id'])
+    )
+    _add_to_totals(
+        db,
+        current_row['task_id'],
+        current_row['project_id'],
+        current_row['time_in'],
+        now
+    )
+    _track_longest(db, now - current_row['time_in'])
+    return (current_row['id'], notes, now)
+
+
+def write_actions(db, actions):
+    """Carries out a batch of clock actions in a single transaction (a group
+    commit), each at the time it was taken rather than when written. See
+    journal.py.
+
+    An action whose time is already in the database has been written before,
+    so is not carried out again, and a batch can be written again after an
+    interruption. An action that cannot be carried out is rolled back on its
+    own, leaving the rest of the batch.
+
+    Args:
+        db (sqlite3.Connection): open connection to the timesheet database.
+        actions (list): ("in", task, project, notes, time) and ("out", notes,
+            time) tuples, with times as from to_epoch().
+
+    Returns:
+        (list): the result of each action, as returned by clock_in() or
+            clock_out(), or an Active_Task_Exception if it was a clock in
+            while another task was running, or a clock out from before the
+            running task was clocked in.
+    """
+    results = []
+    db.execute('begin')
+    try:
+        for action, *args in actions:
+            db.execute('savepoint action')
+            try:
+                results.append(_WRITERS[action](db, *args))
+            except (sqlite3.IntegrityError, Active_Task_Exception):
+                db.execute('rollback to action')
+                results.append(Active_Task_Exception())
+            db.execute('release action')
+        db.commit()
+    except BaseException:
+        db.rollback()
+        raise
+    return results
+
+
+def _write_clock_in(db, task, project, notes, now):
+    written = db.execute(
+        'select id from timesheet where time_in=(?)',
+        (now, )
+    ).fetchone()
+    if written:
+        return (written[0], now)
+    return (_clock_in(db, task, project, notes, now), now)
+
+
+def _write_clock_out(db, notes, now):
+    # Found through the 'timesheet_time_out' index
+    written = db.execute(
+        'select id, notes from timesheet '
+        f'where {HISTORY_SORTS["time_out"][0]}=(?)',
+        (now, )
+    ).fetchone()
+    if written:
+        return (written[0], written[1], now)
+    running = db.execute(
+        'select time_in from timesheet where time_out is null'
+    ).fetchone()
+    if running and running[0] > now:
+        # Clocked in again since, as from the command line, after the record
+        # this clocked out of was closed
+        raise Active_Task_Exception()
+    return _clock_out(db, notes, now)
+
+
+_WRITERS = {
+    "in": _write_clock_in,
+    "out": _write_clock_out
+}
+# action: function carrying it out within write_actions()
+
+
+def add_records(db, records):
+    """Adds a batch of complete records in a single transaction, such as when
+    importing from another program. Task and project names are added or
+    updated as in clock_in(), and closed records are added to 'totals' and
+    the longest record length as in clock_out(). The records are added to
+    the 'search' index together, rather than one at a time.
+
+    Args:
+        db (sqlite3.Connection): open connection to the timesheet database.
+        records (list): (task, project, notes, time_in, time_out) tuples, with
+            times as from to_epoch(). A time_out of None marks the currently
+            running task.
+
+    Raises:
+        Active_Task_Exception: If more than one record would be running.
+    """
+    try:
+        with db:
+            task_ids = _intern_many(db, 'task', [
+                (record[0], record[3]) for record in records
+            ])
+            project_ids = _intern_many(db, 'project', [
+                (record[1], record[3]) for record in records
+            ])
+            last_id = db.execute(
+                'select coalesce(max(id), 0) from timesheet'
+            ).fetchone()[0]
+            db.executemany(
+                'insert into timesheet'
+                '(task_id, project_id, notes, time_in, time_out) '
+                'values (?, ?, ?, ?, ?)',
+                [
+                    (task_ids[task], project_ids[project], notes, time_in,
+                     time_out)
+                    for task, project, notes, time_in, time_out in records
+                ]
+            )
+            _index_search(db, last_id)
+            totals = {}
+            for task, project, notes, time_in, time_out in records:
+                if time_out is None:
+                    continue
+                ids = (task_ids[task], project_ids[project])
+                _split_into(totals, ids, time_in, time_out)
+            _add_totals(db, totals)
+            _track_longest(db, max(
+                (record[4] - record[3] for record in records
+                 if record[4] is not None),
+                default=0
+            ))
+    except sqlite3.IntegrityError:
+        raise Active_Task_Exception()
+
+
+def export_records(db, start=None, end=None, task=None, project=None,
+                   chunk_size=EXPORT_CHUNK):
+    """Yields every record matching the given filters, in chunks of up to
+    chunk_size records read from a single cursor, so that any number of
+    records can be exported without holding them all in memory.
+
+    The filters are applied by SQLite, and times are formatted by SQLite as
+    they are read, as ISO 8601 local times. Records are in the order they
+    were added within each archive and then the database, as this needs no
+    sorting of the results.
+
+    Args:
+        db (sqlite3.Connection): open connection to the timesheet database.
+        start (datetime.datetime): only records clocked in at or after this
+            time. Defaults to None, for no limit.
+        end (datetime.datetime): only records clocked in before this time.
+            Defaults to None, for no limit.
+        task (str): only records of this task. Defaults to None, for any.
+        project (str): only records of this project. Defaults to None, for
+            any.
+        chunk_size (int): number of records fetched at a time.
+
+    Yields:
+        (list): (task, project, notes, time_in, time_out) sqlite3.Row records,
+            with a time_out of None for the currently running task.
+    """
+    start = None if start is None else to_epoch(start)
+    end = None if end is None else to_epoch(end)
+    filters = []
+    params = []
+    if start is not None:
+        filters.append('time_in>=(?)')
+        params.append(start)
+    if end is not None:
+        filters.append('time_in<(?)')
+        params.append(end)
+    if task is not None:
+        filters.append('task.name=(?)')
+        params.append(task)
+    if project is not None:
+        filters.append('project.name=(?)')
+        params.append(project)
+    where = f'where {" and ".join(filters)} ' if filters else ''
+    for schema in partitions(db, start, end):
+        cursor = db.execute(
+            'select task.name as task, project.name as project, notes, '
+            f'{_iso_time("time_in")} as time_in, '
+            f'{_iso_time("time_out")} as time_out '
+            f'from {schema}.timesheet as timesheet '
+            'join task on task.id=task_id '
+            'join project on project.id=project_id '
+            f'{where}'
+            'order by timesheet.id',
+            params
+        )
+        try:
+            while True:
+                chunk = cursor.fetchmany(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            cursor.close()
+
+
+def history_page(db, limit, last=None, sort="id", descending=True,
+                 search="", task=None, project=None, start=None, end=None):
+    """Fetches a page of records for the History view, sorted and filtered by
+    SQLite.
+
+    Each page continues from the last record of the one before (keyset
+    pagination), by comparing the sorted value and then the id, so a page
+    costs the same however far down it is. Records with the same sorted
+    value are in the same order as their ids.
+
+    The page is fetched from the database and from each archive that may
+    hold records of it, and the first 'limit' of them are kept. Sorted by id
+    or time, an archive is only read if the range of those it holds reaches
+    the page, so the archives of older years are left unattached until the
+    History is scrolled back to them.
+
+    Args:
+        db (sqlite3.Connection): open connection to the timesheet database.
+        limit (int): maximum number of records to fetch.
+        last (tuple): the last record of the previous page, as returned by
+            this function. Defaults to None, for the first page.
+        sort (str): a key of HISTORY_SORTS. Defaults to "id", the order in
+            which the records were added.
+        descending (bool): True to sort from highest to lowest.
+        search (str): only records matching this text in the 'search' index.
+            See match_query(). Defaults to "", for any.
+        task (str): only records of this task. Defaults to None, for any.
+        project (str): only records of this project. Defaults to None, for
+            any.
+        start (datetime.datetime): only records clocked in at or after this
+            time. Defaults to None, for no limit.
+        end (datetime.datetime): only records clocked in before this time.
+            Defaults to None, for no limit.
+
+    Returns:
+        (list): (id, task, project, notes, time_in, time_out) sqlite3.Row
+            records, with times as from to_epoch() and a time_out of None for
+            the currently running task.
+    """
+    search = match_query(search)
+    start = None if start is None else to_epoch(start)
+    end = None if end is None else to_epoch(end)
+    column = HISTORY_SORTS[sort][1]
+
+    def key(record):
+        value = record[column]
+        return (_RUNNING if value is None else value, record[0])
+
+    query = (limit, last, sort, descending, search, task, project, start, end)
+    page = _history_query(db, 'main', *query)
+    bounds = _ARCHIVE_BOUNDS.get(sort)
+    archives = _archives(db, start, end)
+    if bounds:
+        # Archives are read in the order of the values they hold, so that
+        # those after a full page can be passed over
+        archives.sort(key=lambda archive: archive[bounds[descending]],
+                      reverse=descending)
+    for archive in archives:
+        if bounds:
+            lowest, highest = archive[bounds[0]], archive[bounds[1]]
+            if last is not None and (
+                lowest > key(last)[0] if descending
+                else highest < key(last)[0]
+            ):
+                continue
+            if len(page) == limit and (
+                highest < key(page[-1])[0] if descending
+                else lowest > key(page[-1])[0]
+            ):
+                continue
+        page += _history_query(db, _attach_archive(db, archive[0]),
+                               *query)
+        page.sort(key=key, reverse=descending)
+        del page[limit:]
+    return page
+
+
+_ARCHIVE_BOUNDS = {
+    "id": (1, 2),
+    "time_in": (3, 4),
+    "time_out": (5, 6)
+}
+# sort: indexes of the lowest and highest value sorted by in an _archives()
+# row, for the sorts whose range in each archive is known
+
+
+def _history_query(db, schema, limit, last, sort, descending, search, task,
+                   project, start, end):
+    # Fetches a page of history_page() from the records in one schema, either
+    # 'main' or an attached archive, with start and end as from to_epoch().
+    sort_key, column = HISTORY_SORTS[sort]
+    source = f'{schema}.timesheet as timesheet '
+    joins = {
+        'task': 'join task on task.id=task_id ',
+        'project': 'join project on project.id=project_id '
+    }
+    if sort in joins and not (search or task or project):
+        # A cross join makes SQLite read the names in order from their index,
+        # then the records of each, rather than sorting every record. Other
+        # filters leave fewer records to sort than this would read.
+        source = (
+            f'{sort} cross join {schema}.timesheet as timesheet '
+            f'on {sort}.id={sort}_id '
+        )
+        del joins[sort]
+    filters = []
+    params = []
+    if search and sort == "id":
+        # Matches are found in the index, in its rowid (record id) order
+        source = (
+            f'{schema}.search as search '
+            f'join {schema}.timesheet as timesheet '
+            'on timesheet.id=search.rowid '
+        )
+        sort_key = 'search.rowid'
+        filters.append('search match (?)')
+        params.append(search)
+    elif search:
+        filters.append(
+            'timesheet.id in '
+            f'(select rowid from {schema}.search as search '
+            'where search match (?))'
+        )
+        params.append(search)
+    if start is not None:
+        filters.append('time_in>=(?)')
+        params.append(start)
+    if end is not None:
+        filters.append('time_in<(?)')
+        params.append(end)
+    if task is not None:
+        filters.append('task.name=(?)')
+        params.append(task)
+    if project is not None:
+        filters.append('project.name=(?)')
+        params.append(project)
+    direction, after = ('desc', '<') if descending else ('asc', '>')
+    order = f'{sort_key} {direction}'
+    if sort != "id":
+        order += f', timesheet.id {direction}'
+    if last is not None and sort == "id":
+        filters.append(f'{sort_key}{after}(?)')
+        params.append(last[0])
+    elif last is not None:
+        # Written out rather than as a row value, (sort_key, id)<(?, ?), which
+        # SQLite does not search an expression index for
+        value = last[column] if last[column] is not None else _RUNNING
+        filters.append(
+            f'{sort_key}{after}=(?) '
+            f'and ({sort_key}{after}(?) or timesheet.id{after}(?))'
+        )
+        params.extend((value, value, last[0]))
+    where = f'where {" and ".join(filters)} ' if filters else ''
+    return db.execute(
+        'select timesheet.id, task.name, project.name, '
+        'timesheet.notes, time_in, time_out '
+        f'from {source}{"".join(joins.values())}'
+        f'{where}'
+        f'order by {order} '
+        'limit (?)',
+        params + [limit]
+    ).fetchall()
+
+
+def notes(db, ids):
+    """Fetches the notes of records, from the database or the archive holding
+    each.
+
+    Args:
+        db (sqlite3.Connection): open connection to the timesheet database.
+        ids (list): ids of the records, up to HISTORY_PAGE of them.
+
+    Returns:
+        (dict): the notes of each record found, by id.
+    """
+    found = _notes_query(db, 'main', ids)
+    for archive in _archives(db):
+        missing = [
+            record_id for record_id in ids
+            if record_id not in found and archive[1] <= record_id <= archive[2]
+        ]
+        if missing:
+            found.update(
+                _notes_query(db, _attach_archive(db, archive[0]), missing)
+            )
+    return found
+
+
+def _notes_query(db, schema, ids):
+    # Fetches notes() from the records in one schema.
+    return {
+        row[0]: row[1] for row in db.execute(
+            f'select id, notes from {schema}.timesheet '
+            f'where id in ({", ".join("?" * len(ids))})',
+            ids
+        )
+    }
+
+
+def _iso_time(column):
+    # SQL expression formatting a stored time as 'YYYY-MM-DD HH:MM:SS.ffffff'
+    # in local time, or NULL for a NULL time.
+    return (
+        f"strftime('%Y-%m-%d %H:%M:%S', {column}/1000000, 'unixepoch', "
+        f"'localtime')||printf('.%06d', {column}%1000000)"
+    )
+
+
+def tasks_projects(db):
+    """Queries the database and returns sorted lists of all tasks and
+    projects respectively.
+
+    Args:
+        db (sqlite3.Connection): open connection to the timesheet database.
+
+    Returns:
+        (tuple): tuple containing:
+            - tasks(list): all tasks, alpha-sorted
+            - projects(list): all projects, alpha-sorted
+    """
+    tasks = [
+        row['name'] for row in
+        db.execute('select name from task order by name')
+    ]
+    projects = [
+        row['name'] for row in
+        db.execute('select name from project order by name')
+    ]
+    return tasks, projects
+
+
+def names_page(db, item_type, after=0, limit=NAMES_PAGE):
+    """Queries a page of the task or project names, with how often and when
+    each was last clocked in, in the order they were first used. Each page
+    follows the last id of the one before, so names added meanwhile are
+    fetched in later pages.
+
+    Args:
+        db (sqlite3.Connection): open connection to the timesheet database.
+        item_type (str): 'task' or 'project'.
+        after (int): id of the last name of the page before. Defaults to 0,
+            for the first page.
+        limit (int): maximum number of names. Defaults to NAMES_PAGE.
+
+    Returns:
+        (list): tuples of (id, name, uses, last_used), with last_used as from
+            to_epoch(), or None if never clocked in.
+
+    Raises:
+        ValueError: if item_type is neither 'task' nor 'project'.
+    """
+    if item_type not in ("task", "project"):
+        raise ValueError(f"Unknown item type: {item_type}")
+    return [
+        tuple(row) for row in db.execute(
+            f'select id, name, uses, last_used from {item_type} '
+            'where id>(?) order by id limit (?)',
+            (after, limit)
+        )
+    ]
+
+
+def current_task_project(db):
+    """Queries the database and returns the details within the 'current'
+    record as denoted by an empty time_out.
+
+    Args:
+        db (sqlite3.Connection): open connection to the timesheet database.
+
+    Returns:
+        (tuple): tuple containing the below, or None:
+            - task(str): task name
+            - project(str): project name
+            - notes(str): notes
+            - time_in(str): time of clock in, in human-readable format
+    """
+    cursor = db.execute(
+        'select task.name as task, project.name as project, notes, time_in '
+        'from timesheet '
+        'join task on task.id=task_id '
+        'join project on project.id=project_id '
+        'where time_out is null'
+    )
+    current_row = cursor.fetchone()
+    if current_row:
+        return (
+            current_row['task'],
+            current_row['project'],
+            current_row['notes'],
+            from_epoch(current_row['time_in']).strftime(CLOCKED_IN_FORMAT)
+        )
+    else:
+        return None
+
+
+def most_recent(db):
+    """Queries the database and returns the most recent record, which may
+    or may not be currently active.
+
+    Args:
+        db (sqlite3.Connection): open connection to the timesheet database.
+
+    Raises:
+        Empty_DB_Exception: In case of fresh install or deleted records.
+
+    Returns:
+        (tuple): tuple containing:
+            - task(str): task name
+            - project(str): project name
+    """
+    cursor = db.execute(
+        'select task.name as task, project.name as project '
+        'from timesheet '
+        'join task on task.id=task_id '
+        'join project on project.id=project_id '
+        'order by timesheet.id desc '
+        'limit 1'
+    )
+    recent = cursor.fetchone()
+    if not recent:
+        raise Empty_DB_Exception()
+    return (recent['task'], recent['project'])
+
+
+def get_total_time(db, item_type, item_name):
+    """Provides total time elapsed for the chosen task or project (as
+    defined by parameters).
+
+    Closed records are read from the 'totals' rollup table, so only the
+    currently active record (if any) is calculated on request. See
+    time_baseline() and add_running().
+
+    Args:
+        db (sqlite3.Connection): open connection to the timesheet database.
+        item_type (str): column to search (task or project)
+        item_name (str): keyword to search within column
+
+    Returns:
+        (tuple): tuple containing:
+            - total(datetime.timedelta): total time elapsed
+            - week_total(datetime.timedelta): time elapsed for this week
+    """
+    now = dt.now()
+    return add_running(time_baseline(db, item_type, item_name, now), now)
+
+
+def time_baseline(db, item_type, item_name, now=None):
+    """Provides the time elapsed in the closed records of the chosen task or
+    project, and when its running record was clocked in, if it has one. The
+    time of the running record can then be added as it grows, with
+    add_running(), without querying again until a record is closed or the
+    week ends.
+
+    Args:
+        db (sqlite3.Connection): open connection to the timesheet database.
+        item_type (str): column to search (task or project)
+        item_name (str): keyword to search within column
+        now (datetime.datetime): the time whose week is totalled. Defaults
+            to the current time.
+
+    Returns:
+        (tuple): tuple containing, as from to_epoch():
+            - total(int): total time elapsed in closed records
+            - week_total(int): time elapsed in closed records this week
+            - time_in(int): clock in of the running record, or None
+            - week_start(int): start of this week
+            - week_end(int): end of this week, after which the baseline is
+                out of date
+    """
+    if item_type not in ("task", "project"):
+        raise ValueError(f"Unknown item type: {item_type}")
+    now = dt.now() if now is None else now
+    week_start = _week_start(now)
+    baseline = [
+        0,
+        0,
+        None,
+        to_epoch(week_start),
+        to_epoch(week_start + delta(days=7))
+    ]
+    item = db.execute(
+        f'select id from {item_type} where name=(?)',
+        (item_name, )
+    ).fetchone()
+    if not item:
+        return tuple(baseline)
+    row = db.execute(
+        'select coalesce(sum(elapsed), 0) as total, '
+        'coalesce(sum(case when week=(?) then elapsed end), 0) as week '
+        f'from totals where {item_type}_id=(?)',
+        (_week_key(now), item['id'])
+    ).fetchone()
+    baseline[0] = row['total']
+    baseline[1] = row['week']
+    current_row = db.execute(
+        'select time_in from timesheet where time_out is null '
+        f'and {item_type}_id=(?)',
+        (item['id'], )
+    ).fetchone()
+    if current_row:
+        baseline[2] = current_row['time_in']
+    return tuple(baseline)
+
+
+def add_running(baseline, now=None):
+    """Adds the time elapsed in the running record up to now to a baseline
+    from time_baseline().
+
+    Args:
+        baseline (tuple): as from time_baseline().
+        now (datetime.datetime): the time to total up to, within the
+            baseline's week. Defaults to the current time.
+
+    Returns:
+        (tuple): tuple containing:
+            - total(datetime.timedelta): total time elapsed
+            - week_total(datetime.timedelta): time elapsed for this week
+    """
+    total, week_total, time_in, week_start, _ = baseline
+    if time_in is not None:
+        now = to_epoch(dt.now() if now is None else now)
+        total += now - time_in
+        week_total += now - max(time_in, week_start)
+    return (delta(microseconds=total), delta(microseconds=week_total))
+
+
+def week_totals(db, item_type):
+    """Provides the time elapsed this week for every task or project worked
+    on this week, including the currently active record.
+
+    Args:
+        db (sqlite3.Connection): open connection to the timesheet database.
+        item_type (str): column to total by (task or project)
+
+    Returns:
+        (list): (name, datetime.timedelta) tuples, alpha-sorted by name
+    """
+    if item_type not in ("task", "project"):
+        raise ValueError(f"Unknown item type: {item_type}")
+    now = dt.now()
+    totals = {}
+    for row in db.execute(
+        f'select name, sum(elapsed) as elapsed from totals '
+        f'join {item_type} on {item_type}.id={item_type}_id '
+        'where week=(?) group by name',
+        (_week_key(now), )
+    ):
+        totals[row['name']] = row['elapsed']
+    current_row = db.execute(
+        'select name, (?)-max(time_in, (?)) as elapsed from timesheet '
+        f'join {item_type} on {item_type}.id={item_type}_id '
+        'where time_out is null',
+        (to_epoch(now), to_epoch(_week_start(now)))
+    ).fetchone()
+    if current_row:
+        name = current_row['name']
+        totals[name] = totals.get(name, 0) + current_row['elapsed']
+    return [
+        (name, delta(microseconds=totals[name]))
+        for name in sorted(totals)
+    ]
+
+
+def overlapping(db, start, end):
+    """Finds every record overlapping a time window, including the currently
+    active record, and the time of each within the window.
+
+    Records are found through the 'timesheet_interval' index on time_in. A
+    record overlapping the window can have started no earlier than the
+    longest record length before it, so only that range of the index is
+    searched, and the time taken grows with the logarithm of the number of
+    records rather than the number itself.
+
+    Args:
+        db (sqlite3.Connection): open connection to the timesheet database.
+        start (datetime.datetime): start of the window.
+        end (datetime.datetime): end of the window, which is not included.
+
+    Returns:
+        (list): (id, task, project, notes, time_in, time_out, elapsed) tuples
+            ordered by time_in, with times as from to_epoch(). elapsed is the
+            microseconds of the record within the window, and time_out is None
+            for the active record.
+    """
+    rows = query_window(
+        db,
+        'select window.id, task.name, project.name, notes, time_in, time_out, '
+        'min(coalesce(time_out, :now), :end)-max(time_in, :start) '
+        'from window '
+        'join task on task.id=task_id '
+        'join project on project.id=project_id '
+        'order by time_in',
+        to_epoch(start),
+        to_epoch(end)
+    )
+    return sorted((tuple(row) for row in rows), key=lambda row: row[4])
+
+
+def window_totals(db, start, end, item_type):
+    """Provides the time elapsed within a time window for every task or
+    project worked on within it, including the currently active record. See
+    overlapping().
+
+    Args:
+        db (sqlite3.Connection): open connection to the timesheet database.
+        start (datetime.datetime): start of the window.
+        end (datetime.datetime): end of the window, which is not included.
+        item_type (str): column to total by (task or project)
+
+    Returns:
+        (list): (name, datetime.timedelta) tuples, alpha-sorted by name
+    """
+    if item_type not in ("task", "project"):
+        raise ValueError(f"Unknown item type: {item_type}")
+    rows = query_window(
+        db,
+        'select name, '
+        'sum(min(coalesce(time_out, :now), :end)-max(time_in, :start)) '
+        'from window '
+        f'join {item_type} on {item_type}.id={item_type}_id '
+        'group by name',
+        to_epoch(start),
+        to_epoch(end)
+    )
+    totals = {}
+    for name, elapsed in rows:
+        totals[name] = totals.get(name, 0) + elapsed
+    return [
+        (name, delta(microseconds=totals[name]))
+        for name in sorted(totals)
+    ]
+
+
+def query_window(db, select, start, end):
+    """Runs a query over 'window', the records overlapping a time window,
+    with columns as in 'timesheet'. See overlapping().
+
+    The query may use the named parameters :start, :end and :now, the current
+    time.
+
+    The query is run over the window of the database, and then over that of
+    each archive holding records of it, and the rows of every run are
+    returned together. Any grouping or ordering is therefore within each run,
+    for the caller to combine.
+
+    Args:
+        db (sqlite3.Connection): open connection to the timesheet database, or
+            a cursor of one.
+        select (str): the query, such as 'select id from window'.
+        start (int): start of the window, as from to_epoch().
+        end (int): end of the window, which is not included.
+
+    Returns:
+        (list): every row returned by the query.
+    """
+    # The active record is found separately through the 'active_session'
+    # index, as its length is not yet known. It only overlaps a window that
+    # starts before now. SQLite would otherwise scan the
+    # whole 'timesheet_interval' index for it when the results are ordered by
+    # time_in.
+    params = {
+        "now": to_epoch(dt.now()),
+        "start": start,
+        "end": end,
+        "earliest": start - longest_session(db)
+    }
+    rows = []
+    for schema in partitions(db, params["earliest"], end):
+        active = ''
+        if schema == 'main':
+            active = (
+                'union all '
+                'select id, task_id, project_id, notes, time_in, time_out '
+                'from timesheet indexed by active_session '
+                'where time_out is null and time_in<:end and :now>:start'
+            )
+        rows += db.execute(
+            'with window as ('
+            'select id, task_id, project_id, notes, time_in, time_out '
+            f'from {schema}.timesheet '
+            'where time_in>=:earliest and time_in<:end and time_out>:start '
+            f'{active}) '
+            f'{select}',
+            params
+        ).fetchall()
+    return rows
+
+
+def longest_session(db):
+    """Provides the length of the longest closed record, or possibly longer
+    if that record has been deleted.
+
+    Args:
+        db (sqlite3.Connection): open connection to the timesheet database.
+
+    Returns:
+        (int): length in microseconds.
+    """
+    return db.execute('select longest from session_stats').fetchone()[0]
+
+
+def archive(db, before):
+    """Moves the closed records clocked in before a time out of the database,
+    into an archive for each year they were clocked in, then vacuums the
+    database to give back the space they took. See archive_path().
+
+    The records keep their ids, and their task and project names stay in the
+    database, so archives are only read attached to it. The 'totals' rollup
+    table and the longest record length still count the archived records, so
+    are left as they are. The newest record is never archived, as SQLite
+    would otherwise give its id to the next record.
+
+    Each year is moved in a transaction of its own. A record already in its
+    archive, as when a move was interrupted, is not copied again.
+
+    Args:
+        db (sqlite3.Connection): open connection to the timesheet database.
+        before (datetime.datetime): archive records clocked in before this.
+
+    Returns:
+        (int): number of records archived.
+    """
+    cutoff = to_epoch(before)
+    first, newest = db.execute(
+        'select (select min(time_in) from timesheet '
+        'where time_out is not null), max(id) from timesheet'
+    ).fetchone()
+    moved = 0
+    if first is None or first >= cutoff:
+        return moved
+    for year in range(from_epoch(first).year, from_epoch(cutoff).year + 1):
+        moved += _archive_year(
+            db,
+            year,
+            max(to_epoch(dt(year, 1, 1)), first),
+            min(to_epoch(dt(year + 1, 1, 1)), cutoff),
+            newest
+        )
+    if moved:
+        with db:
+            db.execute("insert into search(search) values ('optimize')")
+        db.execute('vacuum')
+    return moved
+
+
+def _archive_year(db, year, start, end, newest):
+    # Moves the closed records clocked in from start up to end, all within
+    # the year, into its archive. Returns the number moved.
+    params = {"start": start, "end": end, "newest": newest}
+    moving = (
+        'time_in>=:start and time_in<:end and time_out is not null '
+        'and timesheet.id<:newest'
+    )
+    if not db.execute(
+        f'select 1 from timesheet where {moving} limit 1',
+        params
+    ).fetchone():
+        return 0
+    filename = archive_path(db, year)
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    schema = f'archive_{year}'
+    if schema in _attached(db):
+        # Read only, so attached again to write
+        db.execute(f'detach database {schema}')
+    db.execute('attach database (?) as archiving', (filename, ))
+    try:
+        _create_archive(db)
+        new = (
+            f'{moving} and timesheet.id not in '
+            '(select id from archiving.timesheet)'
+        )
+        with db:
+            db.execute(
+                'insert into archiving.search(rowid, notes, task, project) '
+                'select timesheet.id, notes, task.name, project.name '
+                'from main.timesheet '
+                'join task on task.id=task_id '
+                'join project on project.id=project_id '
+                f'where {new}',
+                params
+            )
+            db.execute(
+                'insert into archiving.timesheet '
+                'select id, task_id, project_id, notes, time_in, time_out '
+                f'from main.timesheet where {new}',
+                params
+            )
+            moved = db.execute(
+                f'delete from main.timesheet where {moving}',
+                params
+            ).rowcount
+            db.execute(
+                'insert or replace into archives '
+                'select (?), min(id), max(id), min(time_in), max(time_in), '
+                'min(time_out), max(time_out), count(*) '
+                'from archiving.timesheet',
+                (year, )
+            )
+    finally:
+        db.execute('detach database archiving')
+    return moved
+
+
+def _create_archive(db):
+    # Creates the tables and indexes of the archive attached as 'archiving',
+    # if new. Records are indexed as in the database, for the same queries,
+    # and 'search' keeps its own copy of their text, as the names it would
+    # read are in another file.
+    db.execute(
+        'create table if not exists archiving.timesheet'
+        '(id integer primary key, '
+        'task_id integer not null, '
+        'project_id integer not null, '
+        'notes text, '
+        'time_in integer not null, '
+        'time_out integer not null)'
+    )
+    indexes = {
+        'timesheet_interval': 'time_in, time_out',
+        'timesheet_task': 'task_id',
+        'timesheet_project': 'project_id',
+        'timesheet_task_time': 'task_id, time_in',
+        'timesheet_project_time': 'project_id, time_in',
+        'timesheet_time_out': HISTORY_SORTS["time_out"][0]
+    }
+    for name, columns in indexes.items():
+        db.execute(
+            f'create index if not exists archiving.{name} '
+            f'on timesheet({columns})'
+        )
+    db.execute(
+        'create virtual table if not exists archiving.search using fts5'
+        '(notes, task, project, '
+        "tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+    )
+
+
+def archive_path(db, year):
+    """Provides the path/filename of the archive of a year's records, in
+    ARCHIVE_DIR within the directory of the database, and named after it so
+    that each database has archives of its own.
+
+    Args:
+        db (sqlite3.Connection): open connection to the timesheet database.
+        year (int): the year the records were clocked in.
+
+    Returns:
+        (str): the path/filename of the archive, which may not exist.
+    """
+    directory, name = os.path.split(_attached(db)['main'])
+    return os.path.join(
+        directory,
+        ARCHIVE_DIR,
+        f'{os.path.splitext(name)[0]}-{year}.db'
+    )
+
+
+def partitions(db, start=None, end=None):
+    """Yields the schema name of each archive holding records clocked in
+    within a time range, from the oldest, and then 'main' for the database
+    itself. Each archive is attached read only as it is reached, so a query
+    of the records can be run on each schema in turn, as
+    f'{schema}.timesheet'.
+
+    Up to ARCHIVE_ATTACHED archives stay attached to a connection, after
+    which one is detached for each attached.
+
+    Args:
+        db (sqlite3.Connection): open connection to the timesheet database.
+        start (int): time range start, as from to_epoch(). Defaults to None,
+            for no limit.
+        end (int): time range end, which is not included. Defaults to None,
+            for no limit.
+
+    Yields:
+        (str): schema name.
+    """
+    for archive in _archives(db, start, end):
+        yield _attach_archive(db, archive[0])
+    yield 'main'
+
+
+def _archives(db, start=None, end=None):
+    # Lists the (year, first_id, last_id, first_time_in, last_time_in,
+    # first_time_out, last_time_out) of the archives holding records clocked
+    # in within a time range, oldest first.
+    return db.execute(
+        'select year, first_id, last_id, first_time_in, last_time_in, '
+        'first_time_out, last_time_out from archives '
+        'where last_time_in>=(?) and first_time_in<(?) '
+        'order by year',
+        (
+            -_RUNNING if start is None else start,
+            _RUNNING if end is None else end
+        )
+    ).fetchall()
+
+
+def _attached(db):
+    # Returns a dictionary of the files attached to a connection by schema.
+    return {row[1]: row[2] for row in db.execute('pragma database_list')}
+
+
+def _attach_archive(db, year):
+    # Attaches a year's archive read only, if it is not already, and returns
+    # its schema name.
+    schema = f'archive_{year}'
+    attached = [name for name in _attached(db) if name.startswith('archive_')]
+    if schema in attached:
+        return schema
+    for name in attached[:max(len(attached) - ARCHIVE_ATTACHED + 1, 0)]:
+        try:
+            db.execute(f'detach database {name}')
+        except sqlite3.OperationalError:
+            # Still being read
+            pass
+    db.execute(
+        f'attach database (?) as {schema}',
+        (f'file:{archive_path(db, year)}?mode=ro', )
+    )
+    return schema
+
+
+def to_epoch(moment):
+    """Converts a local datetime into the stored integer format.
+
+    Args:
+        moment (datetime.datetime): naive datetime in local time.
+
+    Returns:
+        (int): microseconds since the Unix epoch.
+    """
+    # The float timestamp is only accurate to about a microsecond, so the
+    # whole seconds are rounded from it and the microseconds added exactly.
+    seconds = round(moment.timestamp() - moment.microsecond / 1000000)
+    return seconds * 1000000 + moment.microsecond
+
+
+def from_epoch(micros):
+    """Converts a stored integer time back into a local datetime.
+
+    Args:
+        micros (int): microseconds since the Unix epoch.
+
+    Returns:
+        (datetime.datetime): naive datetime in local time.
+    """
+    seconds, micro = divmod(micros, 1000000)
+    return dt.fromtimestamp(seconds).replace(microsecond=micro)
+
+
+def migrate(db, chunk_size=MIGRATION_CHUNK):
+    """Brings the database schema up to SCHEMA_VERSION, creating the tables
+    on a fresh install. The 'totals' rollup table is rebuilt if it is missing.
+
+    Databases from before SCHEMA_VERSION 1 stored times as datetime text. These
+    are copied into a new table in chunks of chunk_size records, each chunk in
+    its own transaction, so that the database is never locked for long. If
+    interrupted, the next call resumes from the last copied record. The new
+    table replaces the old one once every record has been copied.
+
+    Before SCHEMA_VERSION 2 an ongoing task had a placeholder time_out rather
+    than an empty one.
+
+    Before SCHEMA_VERSION 3 task and project names were stored in every
+    record. The 'timesheet' table is copied in chunks as above.
+
+    SCHEMA_VERSION 4 added the 'timesheet_interval' index and the
+    'session_stats' table holding the longest record length, for
+    overlapping().
+
+    SCHEMA_VERSION 5 added the 'search' full text index. See match_query().
+
+    SCHEMA_VERSION 6 added an index for each of the HISTORY_SORTS, and for
+    filtering by task or project. See history_page().
+
+    SCHEMA_VERSION 7 added the 'archives' table, listing the yearly archives
+    and the range of records in each. See archive().
+
+    Args:
+        db (sqlite3.Connection): open connection to the timesheet database.
+        chunk_size (int): number of records to convert per transaction.
+    """
+    version = db.execute('pragma user_version').fetchone()[0]
+    if version < 1:
+        _migrate_epoch(db, chunk_size)
+    if version < 2:
+        _migrate_active(db)
+    if version < 3:
+        _migrate_names(db, chunk_size)
+    if version < 4:
+        _migrate_intervals(db)
+    if version < 5:
+        _migrate_search(db)
+    if version < 6:
+        _migrate_history(db)
+    if version < 7:
+        _migrate_archives(db)
+    if not _exists(db, 'totals'):
+        rebuild_totals(db)
+
+
+def _exists(db, table):
+    return db.execute(
+        "select 1 from sqlite_master "
+        "where type='table' and name=(?)",
+        (table, )
+    ).fetchone() is not None
+
+
+def _migrate_epoch(db, chunk_size):
+    legacy = _exists(db, 'timesheet')
+    with db:
+        db.execute(
+            'create table if not exists timesheet_epoch'
+            '(id integer primary key, '
+            'task text, '
+            'project text, '
+            'notes text, '
+            'time_in integer, '
+            'time_out integer)'
+        )
+    while legacy:
+        with db:
+            last_id = db.execute(
+                'select coalesce(max(id), 0) from timesheet_epoch'
+            ).fetchone()[0]
+            rows = db.execute(
+                'select id, task, project, notes, time_in, time_out '
+                'from timesheet where id>(?) order by id limit (?)',
+                (last_id, chunk_size)
+            ).fetchall()
+            db.executemany(
+                'insert into timesheet_epoch '
+                'values (?, ?, ?, ?, ?, ?)',
+                [
+                    (
+                        row['id'],
+                        row['task'],
+                        row['project'],
+                        row['notes'],
+                        _legacy_epoch(row['time_in']),
+                        _legacy_epoch(row['time_out'])
+                    )
+                    for row in rows
+                ]
+            )
+        if len(rows) < chunk_size:
+            break
+    db.execute('begin')
+    if legacy:
+        db.execute('drop table timesheet')
+    db.execute('alter table timesheet_epoch rename to timesheet')
+    db.execute('pragma user_version=1')
+    db.commit()
+
+
+def _legacy_epoch(text):
+    moment = dt.fromisoformat(text)
+    if moment == dt.min:
+        return _LEGACY_ACTIVE
+    return to_epoch(moment)
+
+
+def _migrate_active(db):
+    db.execute('begin')
+    db.execute(
+        'update timesheet set time_out=null where time_out=(?)',
+        (_LEGACY_ACTIVE, )
+    )
+    db.execute(
+        'create unique index if not exists active_session '
+        'on timesheet((time_out is null)) where time_out is null'
+    )
+    db.execute('pragma user_version=2')
+    db.commit()
+
+
+def _migrate_names(db, chunk_size):
+    started = _exists(db, 'timesheet_names')
+    if not started:
+        db.execute('begin')
+        for item_type in ('task', 'project'):
+            db.execute(
+                f'create table {item_type}'
+                '(id integer primary key, '
+                'name text not null unique, '
+                'uses integer not null default 0, '
+                'last_used integer)'
+            )
+            db.execute(
+                f'insert into {item_type}(name, uses, last_used) '
+                f'select {item_type}, count(*), max(time_in) '
+                f'from timesheet group by {item_type}'
+            )
+        db.execute(
+            'create table timesheet_names'
+            '(id integer primary key, '
+            'task_id integer not null references task(id), '
+            'project_id integer not null references project(id), '
+            'notes text, '
+            'time_in integer, '
+            'time_out integer)'
+        )
+        db.commit()
+    while True:
+        with db:
+            last_id = db.execute(
+                'select coalesce(max(id), 0) from timesheet_names'
+            ).fetchone()[0]
+            copied = db.execute(
+                'insert into timesheet_names '
+                'select timesheet.id, task.id, project.id, '
+                'notes, time_in, time_out '
+                'from timesheet '
+                'join task on task.name=timesheet.task '
+                'join project on project.name=timesheet.project '
+                'where timesheet.id>(?) order by timesheet.id limit (?)',
+                (last_id, chunk_size)
+            ).rowcount
+        if copied < chunk_size:
+            break
+    db.execute('begin')
+    db.execute('drop table timesheet')
+    db.execute('alter table timesheet_names rename to timesheet')
+    db.execute(
+        'create unique index active_session '
+        'on timesheet((time_out is null)) where time_out is null'
+    )
+    if _exists(db, 'totals'):
+        db.execute('alter table totals rename to totals_names')
+        _create_totals(db)
+        db.execute(
+            'insert into totals '
+            'select task.id, project.id, week, elapsed from totals_names '
+            'join task on task.name=totals_names.task '
+            'join project on project.name=totals_names.project'
+        )
+        db.execute('drop table totals_names')
+    db.execute('pragma user_version=3')
+    db.commit()
+
+
+def _migrate_intervals(db):
+    db.execute('begin')
+    db.execute(
+        'create index if not exists timesheet_interval '
+        'on timesheet(time_in, time_out)'
+    )
+    db.execute('create table session_stats(longest integer not null)')
+    db.execute(
+        'insert into session_stats '
+        'select coalesce(max(time_out-time_in), 0) from timesheet'
+    )
+    db.execute('pragma user_version=4')
+    db.commit()
+
+
+def _migrate_search(db):
+    # 'search' indexes the notes, task and project of each record, reading
+    # them from the 'search_source' view rather than keeping its own copy.
+    # New records are indexed by _index_search(), in a single statement for
+    # each batch, and triggers keep it in step with any other change.
+    db.execute('begin')
+    db.execute(
+        'create view search_source as '
+        'select timesheet.id as id, notes, '
+        'task.name as task, project.name as project '
+        'from timesheet '
+        'join task on task.id=task_id '
+        'join project on project.id=project_id'
+    )
+    db.execute(
+        'create virtual table search using fts5'
+        '(notes, task, project, '
+        "content='search_source', content_rowid='id', "
+        "tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+    )
+    db.execute("insert into search(search) values ('rebuild')")
+    add = (
+        'insert into search(rowid, notes, task, project) '
+        'select id, notes, task, project from search_source '
+        'where id=new.id;'
+    )
+    remove = (
+        "insert into search(search, rowid, notes, task, project) "
+        "values ('delete', old.id, old.notes, "
+        "(select name from task where id=old.task_id), "
+        "(select name from project where id=old.project_id));"
+    )
+    db.execute(
+        'create trigger search_update '
+        'after update of notes, task_id, project_id on timesheet '
+        f'begin {remove} {add} end'
+    )
+    db.execute(
+        'create trigger search_delete after delete on timesheet '
+        f'begin {remove} end'
+    )
+    for item_type in ('task', 'project'):
+        # A renamed task or project is re-indexed in each of its records
+        db.execute(
+            f'create trigger search_{item_type}_rename '
+            f'after update of name on {item_type} '
+            'begin '
+            "insert into search(search, rowid, notes, task, project) "
+            "select 'delete', timesheet.id, notes, "
+            f"{_old_name(item_type, 'task')}, "
+            f"{_old_name(item_type, 'project')} "
+            f'from timesheet where {item_type}_id=old.id; '
+            'insert into search(rowid, notes, task, project) '
+            'select id, notes, task, project from search_source '
+            f'where id in (select id from timesheet '
+            f'where {item_type}_id=new.id); '
+            'end'
+        )
+    db.execute('pragma user_version=5')
+    db.commit()
+
+
+def _migrate_history(db):
+    # 'task' and 'project' are sorted by their unique name indexes, with each
+    # name's records found by timesheet_task or timesheet_project in id
+    # order. The _time indexes serve a task or project sorted by time_in.
+    db.execute('begin')
+    for item_type in ('task', 'project'):
+        db.execute(
+            f'create index timesheet_{item_type} '
+            f'on timesheet({item_type}_id)'
+        )
+        db.execute(
+            f'create index timesheet_{item_type}_time '
+            f'on timesheet({item_type}_id, time_in)'
+        )
+    db.execute(
+        'create index timesheet_time_out '
+        f'on timesheet({HISTORY_SORTS["time_out"][0]})'
+    )
+    db.execute('pragma user_version=6')
+    db.commit()
+
+
+def _migrate_archives(db):
+    db.execute('begin')
+    db.execute(
+        'create table archives'
+        '(year integer primary key, '
+        'first_id integer not null, '
+        'last_id integer not null, '
+        'first_time_in integer not null, '
+        'last_time_in integer not null, '
+        'first_time_out integer not null, '
+        'last_time_out integer not null, '
+        'records integer not null)'
+    )
+    db.execute('pragma user_version=7')
+    db.commit()
+
+
+def _index_search(db, after):
+    # Adds the records with an id above 'after' to the 'search' index.
+    db.execute(
+        'insert into search(rowid, notes, task, project) '
+        'select id, notes, task, project from search_source '
+        'where id>(?)',
+        (after, )
+    )
+
+
+def _old_name(item_type, column):
+    # SQL for a record's task or project name before the rename of item_type.
+    if item_type == column:
+        return 'old.name'
+    return f'(select name from {column} where id={column}_id)'
+
+
+def match_query(text):
+    """Converts text entered by the user into an FTS5 query for the 'search'
+    index, matching records containing every word in their notes, task or
+    project.
+
+    The last word also matches any word it begins, so that records are found
+    as the text is typed, unless it is a single character. Each word is
+    quoted, so that punctuation in the text is searched for rather than read
+    as query syntax.
+
+    Args:
+        text (str): the user's search text.
+
+    Returns:
+        (str): the query, or '' if the text has no words.
+    """
+    words = ['"' + word.replace('"', '""') + '"' for word in text.split()]
+    if words and len(words[-1]) > 3:
+        # Prefixes of one character are not indexed, and too slow to expand
+        words[-1] += "*"
+    return " ".join(words)
+
+
+def rebuild_totals(db):
+    """Clears and recalculates the 'totals' rollup table from every closed
+    record in the 'timesheet' table and the archives. This is only required
+    for databases created before the rollup table existed, or if it has been
+    damaged.
+
+    The totals are added up before the table is cleared, as archives cannot
+    be attached within a transaction.
+
+    Args:
+        db (sqlite3.Connection): open connection to the timesheet database.
+    """
+    totals = {}
+    for schema in partitions(db):
+        rows = db.execute(
+            'select task_id, project_id, time_in, time_out '
+            f'from {schema}.timesheet where time_out is not null'
+        )
+        for task_id, project_id, time_in, time_out in rows:
+            _split_into(totals, (task_id, project_id), time_in, time_out)
+    with db:
+        _create_totals(db)
+        db.execute('delete from totals')
+        _add_totals(db, totals)
+
+
+def _create_totals(db):
+    db.execute(
+        'create table if not exists totals'
+        '(task_id integer references task(id), '
+        'project_id integer references project(id), '
+        'week text, '
+        'elapsed integer not null default 0, '
+        'primary key (task_id, project_id, week))'
+    )
+    db.execute(
+        'create index if not exists totals_project '
+        'on totals(project_id, week)'
+    )
+
+
+def _add_to_totals(db, task_id, project_id, time_in, time_out):
+    db.executemany(
+        'insert into totals(task_id, project_id, week, elapsed) '
+        'values (?, ?, ?, ?) '
+        'on conflict(task_id, project_id, week) '
+        'do update set elapsed=elapsed+excluded.elapsed',
+        [
+            (task_id, project_id, week, elapsed)
+            for week, elapsed in _split_weeks(time_in, time_out)
+        ]
+    )
+
+
+def _split_into(totals, ids, time_in, time_out):
+    # Adds the time of a record within each week to a dictionary of totals,
+    # keyed by (task_id, project_id, week).
+    for week, elapsed in _split_weeks(time_in, time_out):
+        key = ids + (week, )
+        totals[key] = totals.get(key, 0) + elapsed
+
+
+def _add_totals(db, totals):
+    # Adds a dictionary of totals, as from _split_into(), to 'totals'.
+    db.executemany(
+        'insert into totals(task_id, project_id, week, elapsed) '
+        'values (?, ?, ?, ?) '
+        'on conflict(task_id, project_id, week) '
+        'do update set elapsed=elapsed+excluded.elapsed',
+        [key + (elapsed, ) for key, elapsed in totals.items()]
+    )
+
+
+def _track_longest(db, elapsed):
+    db.execute(
+        'update session_stats set longest=max(longest, (?))',
+        (elapsed, )
+    )
+
+
+def _intern(db, item_type, name, now):
+    # Returns the id of the named task or project, adding it if new.
+    db.execute(
+        f'insert into {item_type}(name, uses, last_used) '
+        'values (?, 1, ?) '
+        'on conflict(name) '
+        'do update set uses=uses+1, last_used=excluded.last_used',
+        (name, now)
+    )
+    return db.execute(
+        f'select id from {item_type} where name=(?)',
+        (name, )
+    ).fetchone()['id']
+
+
+def _intern_many(db, item_type, uses):
+    # Adds or updates each named task or project given as (name, time) pairs,
+    # then returns a dictionary of their ids by name.
+    counts = {}
+    for name, time in uses:
+        count, last_used = counts.get(name, (0, time))
+        counts[name] = (count + 1, max(last_used, time))
+    db.executemany(
+        f'insert into {item_type}(name, uses, last_used) '
+        'values (?, ?, ?) '
+        'on conflict(name) '
+        'do update set uses=uses+excluded.uses, '
+        'last_used=max(coalesce(last_used, 0), excluded.last_used)',
+        [(name, count, last) for name, (count, last) in counts.items()]
+    )
+    return {
+        name: db.execute(
+            f'select id from {item_type} where name=(?)',
+            (name, )
+        ).fetchone()['id']
+        for name in counts
+    }
+
+
+def _split_weeks(time_in, time_out):
+    # Yields (ISO week, elapsed) pairs for each week that a record spans.
+    start = time_in
+    while start < time_out:
+        week, next_week = _week_of(start)
+        end = min(next_week, time_out)
+        yield (week, end - start)
+        start = end
+
+
+_last_week = (0, 0, None)
+# (start, end, ISO week) of the week most recently found by _week_of().
+
+
+def _week_of(micros):
+    # Returns the ISO week containing a time, and the time the week ends.
+    # Consecutive records are usually in the same week, so the last week found
+    # is kept to save converting to and from datetimes.
+    global _last_week
+    start, end, week = _last_week
+    if not start <= micros < end:
+        week_start = _week_start(from_epoch(micros))
+        start = to_epoch(week_start)
+        end = to_epoch(week_start + delta(weeks=1))
+        week = _week_key(week_start)
+        _last_week = (start, end, week)
+    return (week, end)
+
+
+def _week_start(moment):
+    midnight = dt.combine(moment.date(), dt.min.time())
+    return midnight - delta(days=moment.weekday())
+
+
+def _week_key(moment):
+    return moment.strftime("%G-W%V")
+
+
+class Empty_DB_Exception(Exception):
+    """Subclassed exception, for clarity of code.
+    No additional functionality.
+    """
+    pass
+
+
+class Active_Task_Exception(Exception):
+    """Subclassed exception, for clarity of code.
+    No additional functionality.
+    """
+    pass
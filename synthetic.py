@@ -0,0 +1,103 @@
+# Copyright 2021, Andres Fredes, <andres.hector.fredes@gmail.com>
+# 
+# This file is part of timesheet.
+# 
+#     timesheet is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+# 
+#     timesheet is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+# 
+#     You should have received a copy of the GNU General Public License
+#     along with timesheet.  If not, see <https://www.gnu.org/licenses/>.
+
+
+"""Timesheet: task/project time keeping program.
+
+synthetic.py fills a timesheet database with generated records, for
+benchmarking and for trying the program out with a large history. Run it
+directly to fill the database in DATA_DIR:
+
+    python synthetic.py SESSIONS [TASKS] [PROJECTS] [OPEN_SHARE]
+
+Sessions are spread evenly over SYNTHETIC_YEARS up to the present, so that
+the totals have a realistic number of weeks however many sessions there are.
+A few tasks and projects are used far more than the rest, as in real use.
+"""
+
+import random, sys
+from datetime import datetime as dt
+from datetime import timedelta as delta
+
+from config import IMPORT_BATCH, SYNTHETIC_YEARS
+from database import connect
+from storage import add_records, migrate, to_epoch
+
+
+def generate(db, sessions, tasks=200, projects=20, open_share=0.0, seed=0,
+             batch_size=IMPORT_BATCH):
+    """Adds generated records to the database. See storage.add_records().
+
+    Each task belongs to one project. Names are chosen with a weight of
+    1/rank, so the first few are used most.
+
+    Only one session can be running at a time, so open_share is the chance
+    that the newest session is left running, rather than a share of all of
+    them.
+
+    Args:
+        db (sqlite3.Connection): open connection to the timesheet database,
+            which should have no running task if open_share is above 0.
+        sessions (int): number of records to add.
+        tasks (int): number of distinct task names.
+        projects (int): number of distinct project names.
+        open_share (float): chance, from 0 to 1, that the newest session is
+            still running.
+        seed (int): random seed, so that a database can be reproduced.
+        batch_size (int): number of records per transaction.
+    """
+    rand = random.Random(seed)
+    weights = [1 / rank for rank in range(1, tasks + 1)]
+    task_names = [f"Task {number}" for number in range(tasks)]
+    project_names = [
+        f"Project {rand.randrange(projects)}" for _ in range(tasks)
+    ]
+    end = to_epoch(dt.now())
+    start = to_epoch(dt.now() - delta(days=365 * SYNTHETIC_YEARS))
+    spacing = (end - start) // max(sessions, 1)
+    leave_open = rand.random() < open_share
+    batch = []
+    for number in range(sessions):
+        task = rand.choices(range(tasks), weights)[0]
+        time_in = start + number * spacing
+        time_out = time_in + int(spacing * rand.uniform(0.1, 0.9))
+        if leave_open and number == sessions - 1:
+            time_out = None
+        batch.append((
+            task_names[task],
+            project_names[task],
+            f"Notes {number}" if rand.random() < 0.5 else "",
+            time_in,
+            time_out
+        ))
+        if len(batch) == batch_size:
+            add_records(db, batch)
+            batch = []
+    if batch:
+        add_records(db, batch)
+
+
+if __name__ == '__main__':
+    if not 2 <= len(sys.argv) <= 5:
+        print(__doc__.split("\n\n")[1], file=sys.stderr)
+        sys.exit(2)
+    counts = [int(arg) for arg in sys.argv[1:4]]
+    open_share = float(sys.argv[4]) if len(sys.argv) == 5 else 0.0
+    db = connect()
+    migrate(db)
+    generate(db, *counts, open_share=open_share)
+    db.close()
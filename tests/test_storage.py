@@ -0,0 +1,109 @@
+# Copyright 2021, Andres Fredes, <andres.hector.fredes@gmail.com>
+# 
+# This file is part of timesheet.
+# 
+#     timesheet is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+# 
+#     timesheet is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+# 
+#     You should have received a copy of the GNU General Public License
+#     along with timesheet.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Timesheet: task/project time keeping program.
+
+test_storage.py tests the queries of storage.py against a database in a
+temporary directory. Run with:
+
+    python -m unittest discover tests
+"""
+
+import os, sys, tempfile, unittest
+from datetime import datetime as dt
+from datetime import timedelta as delta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import connect
+from storage import (
+    Active_Task_Exception, clock_in, clock_out, migrate, overlapping, to_epoch,
+    window_totals, write_actions
+)
+
+
+class Window_Test(unittest.TestCase):
+    """Queries time windows while a task is clocked in.
+    """
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.db = connect(os.path.join(self.directory.name, "test.db"))
+        migrate(self.db)
+        clock_in(
+            self.db, "Task", "Project", "",
+            to_epoch(dt.now() - delta(hours=2))
+        )
+
+    def tearDown(self):
+        self.db.close()
+        self.directory.cleanup()
+
+    def test_future_window(self):
+        start = dt.now() + delta(days=1)
+        end = start + delta(days=3)
+        self.assertEqual(overlapping(self.db, start, end), [])
+        self.assertEqual(window_totals(self.db, start, end, "task"), [])
+
+    def test_current_window(self):
+        start = dt.now() - delta(days=1)
+        end = dt.now() + delta(days=1)
+        [(name, elapsed)] = window_totals(self.db, start, end, "task")
+        self.assertEqual(name, "Task")
+        self.assertGreaterEqual(elapsed, delta(hours=2))
+        self.assertLess(elapsed, delta(hours=2, minutes=1))
+
+
+class Replay_Test(unittest.TestCase):
+    """Writes journaled clock actions after the command line clocked in.
+    """
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.db = connect(os.path.join(self.directory.name, "test.db"))
+        migrate(self.db)
+        self.start = dt.now() - delta(hours=2)
+        write_actions(
+            self.db, [("in", "GUI", "Project", "", to_epoch(self.start))]
+        )
+
+    def tearDown(self):
+        self.db.close()
+        self.directory.cleanup()
+
+    def test_clock_out_before_running(self):
+        clock_out(self.db, "", to_epoch(self.start + delta(minutes=20)))
+        clock_in(
+            self.db, "CLI", "Project", "",
+            to_epoch(self.start + delta(minutes=30))
+        )
+        [result] = write_actions(
+            self.db, [("out", "", to_epoch(self.start + delta(minutes=10)))]
+        )
+        self.assertIsInstance(result, Active_Task_Exception)
+        running = self.db.execute(
+            'select count(*) from timesheet where time_out is null'
+        ).fetchone()[0]
+        self.assertEqual(running, 1)
+
+    def test_clock_out_after_running(self):
+        [(_, _, time_out)] = write_actions(
+            self.db, [("out", "", to_epoch(self.start + delta(minutes=10)))]
+        )
+        self.assertEqual(time_out, to_epoch(self.start + delta(minutes=10)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -16,15 +16,23 @@
 #     along with __________.  If not, see <https://www.gnu.org/licenses/>.
 
 """Timesheet: task/project time keeping program.
+
+Run without arguments to start the GUI, or with a command (in, out, status,
+report or rebuild-totals) to use the command line interface, which does not
+import PyQt5. See 'python timesheet.py --help'.
 """
 
 import sys
-
-from gui import UI
-from PyQt5.QtWidgets import QApplication
+from time import perf_counter
 
 if __name__ == '__main__':
+    started = perf_counter()
+    if len(sys.argv) > 1:
+        from cli import main
+        sys.exit(main(sys.argv[1:]))
+    from PyQt5.QtWidgets import QApplication
+    from gui import UI
     app = QApplication(sys.argv)
-    win = UI()
+    win = UI(started)
     win.show()
     sys.exit(app.exec_())
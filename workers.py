@@ -0,0 +1,162 @@
+# Copyright 2021, Andres Fredes, <andres.hector.fredes@gmail.com>
+# 
+# This file is part of timesheet.
+# 
+#     timesheet is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+# 
+#     timesheet is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+# 
+#     You should have received a copy of the GNU General Public License
+#     along with timesheet.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Timesheet: task/project time keeping program.
+
+workers.py runs database queries on a pool of background threads, so that a
+slow query never holds up the GUI. Each thread reads through its own read only
+connection, and results are passed back to the GUI thread via Qt signals.
+"""
+
+import logging, threading
+
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal, pyqtSlot
+
+from database import connect
+from instrument import phase
+
+log = logging.getLogger(__name__)
+
+_local = threading.local()
+
+
+def _reader(open_reader):
+    # Each pool thread keeps its own connection for as long as it lives.
+    if not hasattr(_local, "db"):
+        _local.db = open_reader()
+    return _local.db
+
+
+def _open_local():
+    return connect(read_only=True)
+
+
+class Query_Pool(QObject):
+    """Runs queries in a QThreadPool and delivers their results to callbacks
+    in the GUI thread.
+
+    Each query is submitted under a key naming what it is for, such as
+    "totals". Submitting a new query under the same key supersedes any earlier
+    one that has not yet delivered its result: if it has not started it is
+    cancelled, otherwise its result is dropped when it arrives.
+
+    Args:
+        open_reader (function): opens the connection each thread reads
+            through, such as Model.reader. Defaults to a read only connection
+            to the database in DATA_DIR.
+    """
+    def __init__(self, open_reader=_open_local):
+        super().__init__()
+        self.open_reader = open_reader
+        self.pool = QThreadPool()
+        self._pending = {}
+        self._running = set()
+        # Every started query is referenced until it finishes, including
+        # superseded ones, as Python would otherwise delete it mid-run.
+
+    def submit(self, key, func, callback, on_failure=None):
+        """Queues a query, superseding any earlier query with the same key.
+
+        Args:
+            key (str): name of what the query is for.
+            func (function): the query, which will be passed the thread's
+                open connection and should return the result.
+            callback (function): called in the GUI thread with the result.
+            on_failure (function): called in the GUI thread with the
+                exception if the query raises one. Defaults to None, for a
+                failure to only be logged.
+        """
+        self.cancel(key)
+        query = Query(key, func, self.open_reader)
+        query.signals.finished.connect(self._finished)
+        query.signals.failed.connect(self._failed)
+        self._pending[key] = (query, callback, on_failure)
+        self._running.add(query)
+        self.pool.start(query)
+
+    def cancel(self, key):
+        """Cancels the query with this key if it has not started, and
+        otherwise ensures its result will be dropped.
+
+        Args:
+            key (str): name the query was submitted under.
+        """
+        if key in self._pending:
+            query, _, _ = self._pending.pop(key)
+            if self.pool.tryTake(query):
+                self._running.discard(query)
+
+    def wait(self):
+        """Blocks until every running query has finished.
+        """
+        self.pool.waitForDone()
+
+    @pyqtSlot(object, object)
+    def _finished(self, query, result):
+        self._running.discard(query)
+        pending = self._pending.get(query.key)
+        if pending and pending[0] is query:
+            del self._pending[query.key]
+            pending[1](result)
+
+    @pyqtSlot(object, object)
+    def _failed(self, query, error):
+        self._running.discard(query)
+        pending = self._pending.get(query.key)
+        if pending and pending[0] is query:
+            del self._pending[query.key]
+            if pending[2]:
+                pending[2](error)
+
+
+class Query(QRunnable):
+    """A single query run by a Query_Pool.
+
+    Args:
+        key (str): name of what the query is for.
+        func (function): the query, which will be passed the thread's open
+            connection and should return the result.
+        open_reader (function): opens the thread's connection, if it has none.
+    """
+    def __init__(self, key, func, open_reader):
+        super().__init__()
+        self.setAutoDelete(False)
+        self.key = key
+        self.func = func
+        self.open_reader = open_reader
+        self.signals = Query_Signals()
+
+    def run(self):
+        """Runs the query with this thread's connection and emits the result.
+        Called by the QThreadPool.
+        """
+        try:
+            with phase(f"query: {self.key}"):
+                result = self.func(_reader(self.open_reader))
+        except Exception as error:
+            log.exception("Query '%s' failed", self.key)
+            self.signals.failed.emit(self, error)
+        else:
+            self.signals.finished.emit(self, result)
+
+
+class Query_Signals(QObject):
+    """Signals emitted by a Query. QRunnable is not a QObject, so cannot
+    emit signals itself.
+    """
+    finished = pyqtSignal(object, object)
+    failed = pyqtSignal(object, object)